@@ -1,12 +1,15 @@
-import sys, json, traceback, inspect
+import sys, os, json, traceback, inspect
 import http.server
 from types import ModuleType
 from importlib import reload
 
 class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
   functions = {}
+  streams = {}
   redirects = {}
   modules = []
+  # source modification times of every module, when it was last loaded
+  mtimes = {}
 
   def do_GET(self):
     path = self.path.lstrip('/').split('?')[0]
@@ -26,7 +29,9 @@ class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
 
   def do_POST(self):
     path = self.path.lstrip('/').split('?')[0]
-    if path in self.functions:
+    function = self.find_function(path)
+    if function is not None or path in self.streams:
+      streaming = False
       try:
         content_type = self.headers.get('content-type')
         if not 'application/json' in content_type.lower():
@@ -35,7 +40,24 @@ class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
         json_string = self.rfile.read(content_len)
         json_data = json.loads(json_string.decode())
 
-        json_data = self.functions[path](json_data)
+        if path in self.streams:
+          # one JSON value per line, each sent as soon as it's there; a
+          # stream that can't start is the client's fault
+          try:
+            items = iter(self.streams[path](json_data))
+          except ValueError as error:
+            self.send_error(400, str(error))
+            return
+          self.send_response(200, 'OK')
+          self.send_header('Content-Type', 'application/x-ndjson; charset=UTF-8')
+          self.end_headers()
+          streaming = True
+          for item in items:
+            self.wfile.write(bytes(json.dumps(item) + '\n', 'utf-8'))
+            self.wfile.flush()
+          return
+
+        json_data = function(json_data)
         json_string = json.dumps(json_data)
 
         self.send_response(200, 'OK')
@@ -47,7 +69,16 @@ class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
         # throw a 500, print out error
         traceback.print_exc();
         print("SOMETHING CRASHED! See above:")
-        self.send_response(500, 'Internal error')
+        if streaming:
+          # the 200 is out already; a last line tells the client that the
+          # stream broke off rather than ended
+          error = traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip()
+          try:
+            self.wfile.write(bytes(json.dumps({'error': error}) + '\n', 'utf-8'))
+          except OSError:
+            pass
+        else:
+          self.send_response(500, 'Internal error')
     else:
       self.send_error(404, 'function not found: ' + path + " , while registered functions are: " + str(self.functions))
     return
@@ -56,6 +87,11 @@ class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
   def register_function(cls, function, name):
     cls.functions[name] = function
 
+  @classmethod
+  def register_stream(cls, function, name):
+    # function returns an iterable, whose items are sent back as NDJSON
+    cls.streams[name] = function
+
   @classmethod
   def register_redirect(cls, path_from, path_to):
     cls.redirects[path_from] = path_to
@@ -63,21 +99,43 @@ class RPCServerHandler(http.server.SimpleHTTPRequestHandler):
   @classmethod
   def register_module(cls, module_name):
     cls.modules.append(module_name)
+    cls.mtimes[module_name] = cls.source_mtimes(__import__(module_name))
+
+  @classmethod
+  def find_function(cls, name):
+    if name in cls.functions:
+      return cls.functions[name]
+    # public functions of the modules, looked up as they are right now;
+    # names beginning with _ are hidden
+    if not name.startswith('_'):
+      for module_name in cls.modules:
+        f = getattr(sys.modules.get(module_name), name, None)
+        if inspect.isfunction(f):
+          return f
+    return None
+
+  @staticmethod
+  def source_mtimes(module):
+    # modification times of the source of a module and of the modules next
+    # to it that it uses (like lab for wrapper, which reloads it)
+    directory = os.path.dirname(os.path.abspath(module.__file__))
+    mtimes = {}
+    for m in [module] + [v for v in vars(module).values() if isinstance(v, ModuleType)]:
+      path = getattr(m, '__file__', None)
+      if path and os.path.dirname(os.path.abspath(path)) == directory:
+        try:
+          mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+          mtimes[path] = None
+    return mtimes
 
   @classmethod
   def reload_modules(cls):
+    # only modules whose source changed since they were loaded are reloaded
     for module_name in cls.modules:
-      print("in module %s ..." % module_name)
       module = __import__(module_name)
+      if cls.source_mtimes(module) == cls.mtimes.get(module_name):
+        continue
+      print("reloading module %s ..." % module_name)
       reload(module)
-      for f_name in dir(module):
-        f = getattr(module, f_name)
-        # names beginning with _ are hidden
-        if f_name.startswith('_'):
-          continue
-        # non-functions are ignored
-        if not inspect.isfunction(f):
-          continue
-        print("registering function %s" % f_name)
-        cls.register_function(f, f_name)
-
+      cls.mtimes[module_name] = cls.source_mtimes(module)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+asyncio version of server.py: the same static files and RPC routes
+(restart, ls, cat, load_json and the functions of wrapper), but a solve no
+longer holds up everything else.
+
+The functions of the registered modules (ui_assign, ...) run in a pool of
+worker processes, so that solves run on separate cores. At most workers +
+queue_size of them are in flight at once; past that, requests get a 429
+right away instead of piling up. A call that takes longer than timeout
+seconds gets a 504, and is interrupted in its worker at the same time
+(with SIGALRM, so only where there is one), so that it can't hold the
+worker up for the next calls; it counts as in flight until its worker is
+really done with it. Everything else (files, ls, cat, load_json) is served
+from a thread, so it never waits for a worker.
+
+  python3 async_server.py --workers 4 --queue 16 --timeout 30
+"""
+import asyncio, concurrent.futures, inspect, json, mimetypes, os, signal, time, traceback
+import urllib.parse
+from http import HTTPStatus
+from importlib import reload
+
+from RPCServerHandler import RPCServerHandler
+
+# Code to list and serve files, as in server.py
+def ls_path( path ):
+  return [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
+
+def cat_file( path ):
+  with open(path, "r") as f:
+    return f.read()
+
+def load_json_file( path ):
+  with open(path, "r") as f:
+    return json.load(f)
+
+def call_until( function, data, deadline ):
+  # runs in a worker: interrupts the call with a TimeoutError at deadline
+  # (a time.time()), as the server gives up on it then anyway
+  remaining = deadline - time.time()
+  if remaining <= 0:
+    raise TimeoutError
+  if not hasattr(signal, 'setitimer'):
+    return function(data)
+  expired = []
+  def expire(signum, frame):
+    expired.append(True)
+    raise TimeoutError
+  previous = signal.signal(signal.SIGALRM, expire)
+  signal.setitimer(signal.ITIMER_REAL, remaining)
+  try:
+    result = function(data)
+  finally:
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, previous)
+  # the function may have caught the TimeoutError and returned anyway
+  if expired:
+    raise TimeoutError
+  return result
+
+class AsyncRPCServer:
+  def __init__(self, workers=None, queue_size=16, timeout=30):
+    self.workers = workers or os.cpu_count()
+    self.queue_size = queue_size
+    self.timeout = timeout
+    # functions that run in the server process, and in the worker pool
+    self.functions = {}
+    self.remote_functions = {}
+    self.redirects = {}
+    self.modules = []
+    self.mtimes = {}
+    self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+    self.pending = 0
+
+  def register_function(self, function, name, remote=False):
+    # remote functions have to be picklable, i.e. module-level functions
+    (self.remote_functions if remote else self.functions)[name] = function
+
+  def register_redirect(self, path_from, path_to):
+    self.redirects[path_from] = path_to
+
+  def register_module(self, module_name):
+    self.modules.append(module_name)
+    self._register_functions(__import__(module_name))
+
+  def _register_functions(self, module):
+    self.mtimes[module.__name__] = RPCServerHandler.source_mtimes(module)
+    for f_name in dir(module):
+      f = getattr(module, f_name)
+      # names beginning with _ are hidden, non-functions are ignored
+      if f_name.startswith('_') or not inspect.isfunction(f):
+        continue
+      self.register_function(f, f_name, remote=True)
+
+  def reload_modules(self):
+    # only modules whose source changed since they were loaded are reloaded
+    changed = [module for module in map(__import__, self.modules)
+               if RPCServerHandler.source_mtimes(module) != self.mtimes[module.__name__]]
+    if not changed:
+      return
+    # the workers of a new pool import the modules afresh; the old pool
+    # finishes the calls it already started and goes away
+    old, self.pool = self.pool, concurrent.futures.ProcessPoolExecutor(self.workers)
+    old.shutdown(wait=False, cancel_futures=True)
+    for module in changed:
+      print("reloading module %s ..." % module.__name__)
+      self._register_functions(reload(module))
+
+  async def start(self, host="localhost", port=6009):
+    self.server = await asyncio.start_server(self.handle, host, port, reuse_address=True)
+    self.port = self.server.sockets[0].getsockname()[1]
+
+  def close(self):
+    self.server.close()
+    self.pool.shutdown(wait=False, cancel_futures=True)
+
+  async def handle(self, reader, writer):
+    try:
+      request_line = await reader.readline()
+      if not request_line:
+        writer.close()
+        return
+      method, target, _ = request_line.decode('latin-1').split(' ', 2)
+      headers = {}
+      while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+          break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+      body = await reader.readexactly(int(headers.get('content-length', 0)))
+      path = urllib.parse.unquote(target.lstrip('/').split('?')[0])
+      print(method + ": ", path)
+      if method == 'GET':
+        response = await self.do_GET(path)
+      elif method == 'POST':
+        response = await self.do_POST(path, headers, body)
+      else:
+        response = (HTTPStatus.NOT_IMPLEMENTED, {}, b'')
+      status, response_headers, content = response
+    except (ValueError, asyncio.IncompleteReadError):
+      status, response_headers, content = HTTPStatus.BAD_REQUEST, {}, b''
+    try:
+      writer.write(("HTTP/1.1 %d %s\r\n" % (status, status.phrase)).encode('latin-1'))
+      response_headers = dict(response_headers, **{'Content-Length': len(content),
+                                                   'Connection': 'close'})
+      for name, value in response_headers.items():
+        writer.write(("%s: %s\r\n" % (name, value)).encode('latin-1'))
+      writer.write(b'\r\n' + content)
+      await writer.drain()
+      writer.close()
+      await writer.wait_closed()
+    except ConnectionError:
+      pass
+
+  async def do_GET(self, path):
+    # is the file in the redirects table?
+    if path in self.redirects:
+      print("REDIRECT TO ", self.redirects[path])
+      return HTTPStatus.TEMPORARY_REDIRECT, {'Location': self.redirects[path]}, b''
+    # serve the file, if it's under the working directory
+    path = os.path.normpath(path)
+    if os.path.isdir(path):
+      path = os.path.join(path, 'index.html')
+    if path.startswith('..') or os.path.isabs(path) or not os.path.isfile(path):
+      return HTTPStatus.NOT_FOUND, {}, b''
+    with open(path, 'rb') as f:
+      content = await asyncio.get_running_loop().run_in_executor(None, f.read)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return HTTPStatus.OK, {'Content-Type': content_type}, content
+
+  async def do_POST(self, path, headers, body):
+    if path not in self.functions and path not in self.remote_functions:
+      message = ('function not found: ' + path + " , while registered functions are: "
+                 + str(sorted(self.functions) + sorted(self.remote_functions)))
+      return HTTPStatus.NOT_FOUND, {'Content-Type': 'text/plain'}, message.encode()
+    remote = path in self.remote_functions
+    if remote and self.pending >= self.workers + self.queue_size:
+      return HTTPStatus.TOO_MANY_REQUESTS, {'Retry-After': 1}, b''
+    loop = asyncio.get_running_loop()
+    try:
+      if not 'application/json' in headers.get('content-type', '').lower():
+        raise ValueError("PUSH data doesn't look like json. Needs application/json content type.")
+      json_data = json.loads(body.decode())
+      if remote:
+        deadline = time.time() + self.timeout
+        call = self.pool.submit(call_until, self.remote_functions[path], json_data, deadline)
+        # the call is in flight until its worker is done with it, even
+        # after the request gave up on it
+        self.pending += 1
+        call.add_done_callback(lambda call : loop.is_closed() or loop.call_soon_threadsafe(self.finished))
+        json_data = await asyncio.wait_for(asyncio.wrap_future(call), self.timeout)
+        if time.time() >= deadline:
+          # whatever came back, it came too late
+          raise TimeoutError
+      else:
+        json_data = await loop.run_in_executor(None, self.functions[path], json_data)
+      content = json.dumps(json_data).encode('utf-8')
+      return HTTPStatus.OK, {'Content-Type': 'application/json; charset=UTF-8'}, content
+    except (asyncio.TimeoutError, TimeoutError):
+      print("%s TIMED OUT after %s seconds" % (path, self.timeout))
+      return HTTPStatus.GATEWAY_TIMEOUT, {}, b''
+    except Exception:
+      # throw a 500, print out error
+      traceback.print_exc()
+      print("SOMETHING CRASHED! See above:")
+      return HTTPStatus.INTERNAL_SERVER_ERROR, {}, b''
+
+  def finished(self):
+    self.pending -= 1
+
+def make_server(workers=None, queue_size=16, timeout=30):
+  # the same routes as server.py
+  server = AsyncRPCServer(workers, queue_size, timeout)
+  server.register_redirect("", "/ui/index.html")
+  server.register_function(lambda d : server.reload_modules(), 'restart')
+  server.register_function(lambda d : ls_path( d['path'] ), 'ls')
+  server.register_function(lambda d : cat_file( d['path'] ), 'cat')
+  server.register_function(lambda d : load_json_file( d['path'] ), 'load_json')
+  server.register_module("wrapper")
+  return server
+
+async def main(port, **options):
+  server = make_server(**options)
+  await server.start(port=port)
+  print("serving files and RPCs at port", server.port)
+  try:
+    await server.server.serve_forever()
+  finally:
+    print("CLEANING UP!")
+    server.close()
+    print("CLEANED UP")
+
+if __name__ == '__main__':
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Serve the UI and the RPCs with a pool of solver processes")
+  parser.add_argument("--port", type=int, default=6009)
+  parser.add_argument("--workers", type=int)
+  parser.add_argument("--queue", type=int, default=16)
+  parser.add_argument("--timeout", type=float, default=30)
+  parsed = parser.parse_args()
+  try:
+    asyncio.run(main(parsed.port, workers=parsed.workers, queue_size=parsed.queue,
+                     timeout=parsed.timeout))
+  except KeyboardInterrupt:
+    pass
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Batch solving: many independent problems spread over a pool of worker
+processes, with every answer handed back as soon as it's there instead of
+after the slowest one.
+
+A problem is either a formula (list of clauses of (variable, boolean)
+literals, or a lab.CNF), solved by lab.satisfying_assignment, or a
+scheduling problem [student_preferences, room_capacities] (as in the
+test_inputs files), solved by lab.solve_scheduling_problem.
+"""
+
+import multiprocessing
+import threading
+
+import lab
+
+
+# worker processes start from a fresh server process (or interpreter)
+# rather than a fork of the caller, which may be running threads, like the
+# RPC server; forking those can deadlock
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# seconds every formula of the batch RPC gets when the client doesn't say,
+# and the most it can ask for
+RPC_TIMEOUT = 60
+RPC_MAX_TIMEOUT = 600
+
+
+def is_scheduling_problem(problem):
+    """
+    Whether problem is [student_preferences, room_capacities] rather than a
+    formula
+    """
+    return (isinstance(problem, (list, tuple)) and len(problem) == 2
+            and isinstance(problem[0], dict) and isinstance(problem[1], dict))
+
+
+def solve_problem(problem, timeout=None, **options):
+    """
+    Solves one problem, formulas with the given options for
+    lab.satisfying_assignment (and a lab.Budget of timeout seconds, if
+    given). Returns the model, schedule or None, or lab.UNKNOWN if the
+    formula ran out of time.
+
+    Scheduling problems ignore timeout and options: they're solved by
+    matching (lab.schedule_by_matching), in polynomial time and without a
+    search a budget could stop.
+    """
+    if is_scheduling_problem(problem):
+        students, rooms = problem
+        return lab.solve_scheduling_problem(students, rooms)
+    if timeout is not None:
+        options['budget'] = lab.Budget(timeout=timeout)
+    return lab.satisfying_assignment(problem, **options)
+
+
+def _solve_indexed(task):
+    index, problem, timeout, options = task
+    return index, solve_problem(problem, timeout, **options)
+
+
+def solve_many(problems, workers=None, chunksize=None, timeout=None, pool=None, **options):
+    """
+    Solves every problem in problems (see the top of this module) in a pool
+    of worker processes, and yields (index in problems, result) for each of
+    them, in the order they finish.
+
+    workers: number of worker processes, one per CPU core by default (with
+        a single one, the problems are solved in this process).
+    chunksize: how many problems go to a worker at once, by default enough
+        for about four chunks per worker. Bigger chunks take less
+        communication, smaller ones balance the work better and come back
+        sooner.
+    timeout: seconds every formula gets before its result is lab.UNKNOWN
+        (scheduling problems have no timeout, see solve_problem).
+    pool: a multiprocessing.Pool of workers processes to use instead of
+        one of its own.
+    options: passed on to lab.satisfying_assignment for every formula.
+
+    Stopping the iteration early stops the workers, unless they're from
+    pool.
+    """
+    problems = list(problems)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(min(workers, len(problems)), 1)
+    tasks = ((index, problem, timeout, options) for index, problem in enumerate(problems))
+    if chunksize is None:
+        chunksize = -(-len(problems) // (4*workers))
+    if pool is not None:
+        yield from pool.imap_unordered(_solve_indexed, tasks, chunksize)
+        return
+    if workers == 1:
+        yield from map(_solve_indexed, tasks)
+        return
+    with multiprocessing.get_context(START_METHOD).Pool(workers) as pool:
+        yield from pool.imap_unordered(_solve_indexed, tasks, chunksize)
+
+
+# pool that every batch RPC shares, so that there are never more worker
+# processes than cores however many requests come in at once
+_rpc_pool = None
+_rpc_pool_lock = threading.Lock()
+
+def rpc_pool():
+    """
+    The pool of the batch RPC, one worker per CPU core, started on first use
+    """
+    global _rpc_pool
+    with _rpc_pool_lock:
+        if _rpc_pool is None:
+            _rpc_pool = multiprocessing.get_context(START_METHOD).Pool(multiprocessing.cpu_count())
+        return _rpc_pool
+
+
+def answer(index, result):
+    """
+    The JSON answer for the result of problem index
+    """
+    if result is lab.UNKNOWN:
+        return {'index': index, 'status': 'unknown', 'result': None}
+    return {'index': index, 'status': 'unsat' if result is None else 'sat', 'result': result}
+
+
+def solve_many_json(data):
+    """
+    solve_many for the batch RPC: data is a dictionary with the list of
+    problems (in JSON) and optionally chunksize, timeout (RPC_TIMEOUT by
+    default, at most RPC_MAX_TIMEOUT) and options. Every request shares
+    the same pool of workers (see rpc_pool), so workers is ignored. Returns
+    an iterator of {"index": ..., "status": "sat", "unsat" or "unknown",
+    "result": model or null} for every problem as it finishes.
+
+    Raises ValueError right away if data isn't like that, before anything
+    is solved.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('problems'), list):
+        raise ValueError("solve_many needs a list of problems")
+    if not all(isinstance(problem, list) for problem in data['problems']):
+        raise ValueError("every problem has to be a list of clauses or [students, rooms]")
+    chunksize, timeout = data.get('chunksize'), data.get('timeout')
+    if chunksize is not None and (type(chunksize) is not int or chunksize < 1):
+        raise ValueError("chunksize has to be a positive integer")
+    if timeout is not None and (type(timeout) not in (int, float) or timeout <= 0):
+        raise ValueError("timeout has to be a positive number of seconds")
+    options = data.get('options', {})
+    if not isinstance(options, dict):
+        raise ValueError("options have to be an object")
+    timeout = min(timeout or RPC_TIMEOUT, RPC_MAX_TIMEOUT)
+    results = solve_many(data['problems'], multiprocessing.cpu_count(), chunksize, timeout,
+                         pool=rpc_pool(), **options)
+    return (answer(index, result) for index, result in results)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    import json_cnf
+
+    parser = argparse.ArgumentParser(
+        description="Solve the problems in JSON files, printing one JSON line per answer")
+    parser.add_argument("paths", nargs='+')
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunksize", type=int)
+    parser.add_argument("--timeout", type=float)
+    parser.add_argument("--mode", default='cdcl')
+    parsed = parser.parse_args()
+
+    # formulas are read straight into a lab.CNF, which takes a small
+    # fraction of the memory of the lists json.load would make, while every
+    # problem waits for its worker (and to send it to the worker)
+    problems = []
+    for path in parsed.paths:
+        if json_cnf.json_kind(path) == 'formula':
+            problems.append(json_cnf.read_json_cnf(path))
+            continue
+        with open(path) as f:
+            problems.append(json.load(f))
+    results = solve_many(problems, parsed.workers, parsed.chunksize, parsed.timeout,
+                         mode=parsed.mode)
+    for index, result in results:
+        line = answer(index, result)
+        line['path'] = parsed.paths[index]
+        print(json.dumps(line), flush=True)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for lab.satisfying_assignment: every case in test_inputs (the
+formulas in the clause orders test.py tries them in, and the scheduling
+problems through lab.boolify_scheduling_problem), random 3-SAT formulas at
+the phase transition (4.26 clauses per variable, where they are hardest),
+and random scheduling problems of growing size.
+
+Every case records its time (the best of a few runs), its peak memory
+(from one more run under tracemalloc, which slows it down too much to time
+it at the same time), its answer and its lab.Stats. The results can be
+written to JSON and compared against an earlier run, to catch a commit that
+makes things slower:
+
+    python3 bench.py --mode cdcl --output new.json --baseline old.json
+"""
+
+import copy
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import lab
+
+
+TEST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_inputs')
+
+# clauses per variable where random 3-SAT goes from mostly satisfiable to
+# mostly unsatisfiable
+PHASE_TRANSITION = 4.26
+
+RANDOM_SIZES = (50, 100, 150)
+SCHEDULING_SIZES = (40, 80, 160)
+
+
+def permutations(formula):
+    """
+    The clause and literal orders test.py solves every formula in, by name
+    """
+    formula = [[(variable, polarity) for variable, polarity in clause] for clause in formula]
+    reversed_literals = [clause[::-1] for clause in formula]
+    return {'original': formula,
+            'reversed_literals': reversed_literals,
+            'sorted': sorted(reversed_literals),
+            'reversed_clauses': formula[::-1],
+            'by_length': sorted(formula, key=len)}
+
+
+def random_3sat(variables, seed, ratio=PHASE_TRANSITION):
+    """
+    A random formula of round(ratio * variables) clauses, each of three
+    distinct variables
+    """
+    rng = random.Random(seed)
+    return [[("x%d" % v, rng.random() < .5) for v in rng.sample(range(variables), 3)]
+            for _ in range(round(ratio * variables))]
+
+
+def random_scheduling(students, seed):
+    """
+    A random scheduling problem with a room for every four students, where
+    every student lists one to three rooms and the rooms have about 10% more
+    seats than there are students, so that it's tight but usually feasible.
+    Returns (student_preferences, room_capacities).
+    """
+    rng = random.Random(seed)
+    rooms = ['room%d' % i for i in range(max(students // 4, 1))]
+    preferences = {'student%d' % i: rng.sample(rooms, rng.randint(1, min(3, len(rooms))))
+                   for i in range(students)}
+    seats = -(-students * 11 // 10)
+    capacities = {room: seats // len(rooms) + (i < seats % len(rooms))
+                  for i, room in enumerate(rooms)}
+    return preferences, capacities
+
+
+def cases(seed=0, random_sizes=RANDOM_SIZES, scheduling_sizes=SCHEDULING_SIZES):
+    """
+    Yields every benchmark case as (name, formula)
+    """
+    for filename in sorted(os.listdir(TEST_DIRECTORY)):
+        if not filename.endswith('.json'):
+            continue
+        casename = filename.rsplit('.', 1)[0]
+        with open(os.path.join(TEST_DIRECTORY, filename)) as f:
+            data = json.load(f)
+        if data and isinstance(data[0], dict):
+            students, rooms = data
+            yield casename, lab.boolify_scheduling_problem(students, rooms)
+        else:
+            for order, formula in permutations(data).items():
+                yield '%s/%s' % (casename, order), formula
+    for variables in random_sizes:
+        yield '3sat/%d/%d' % (variables, seed), random_3sat(variables, seed)
+    for students in scheduling_sizes:
+        preferences, capacities = random_scheduling(students, seed)
+        yield ('scheduling/%d/%d' % (students, seed),
+               lab.boolify_scheduling_problem(preferences, capacities))
+
+
+def run_case(formula, options, repeat=3, timeout=None):
+    """
+    Benchmarks satisfying_assignment(formula, **options) (on copies of the
+    formula, as the 'copy' mode changes it), giving up on any run after
+    timeout seconds.
+
+    Returns a dictionary with the best time in seconds, the peak memory in
+    bytes, and the answer ('sat', 'unsat' or 'unknown') and Stats of the
+    fastest run.
+    """
+    best = stats = answer = None
+    for _ in range(repeat):
+        formula_copy = copy.deepcopy(formula)
+        run_stats = lab.Stats()
+        start = time.perf_counter()
+        result = lab.satisfying_assignment(formula_copy, stats=run_stats,
+                                           budget=lab.Budget(timeout=timeout), **options)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, stats, answer = elapsed, run_stats, result
+        if result is lab.UNKNOWN:
+            # no point in timing out again
+            break
+
+    formula_copy = copy.deepcopy(formula)
+    tracemalloc.start()
+    try:
+        lab.satisfying_assignment(formula_copy, budget=lab.Budget(timeout=timeout), **options)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    if answer is lab.UNKNOWN:
+        answer = 'unknown'
+    else:
+        answer = 'unsat' if answer is None else 'sat'
+    return {'time': best, 'peak_memory': peak, 'result': answer, 'stats': stats.as_dict()}
+
+
+def run(options=None, seed=0, repeat=3, timeout=None, select=None, progress=None):
+    """
+    Runs every case (or those whose name contains select) with the given
+    options for satisfying_assignment, and calls progress with the name and
+    results of each one as it finishes.
+
+    Returns the results as a dictionary that can go straight to JSON.
+    """
+    options = dict(options or {})
+    results = {'python': platform.python_version(), 'options': options, 'seed': seed,
+               'repeat': repeat, 'timeout': timeout, 'cases': {}}
+    for name, formula in cases(seed):
+        if select is not None and select not in name:
+            continue
+        results['cases'][name] = run_case(formula, options, repeat, timeout)
+        if progress is not None:
+            progress(name, results['cases'][name])
+    return results
+
+
+def compare(results, baseline, threshold=0.25, min_time=0.01):
+    """
+    Compares results against baseline (both from run). A case regressed if
+    its time or peak memory grew by more than threshold (0.25 is 25%), or
+    if it got a different answer. Times under min_time seconds in both runs
+    are too noisy to compare.
+
+    Returns a list of (case, what, baseline value, new value), for the cases
+    both runs have.
+    """
+    regressions = []
+    for name, new in results['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        if old['result'] != new['result']:
+            regressions.append((name, 'result', old['result'], new['result']))
+        if max(old['time'], new['time']) >= min_time and new['time'] > old['time'] * (1 + threshold):
+            regressions.append((name, 'time', old['time'], new['time']))
+        if new['peak_memory'] > old['peak_memory'] * (1 + threshold):
+            regressions.append((name, 'peak_memory', old['peak_memory'], new['peak_memory']))
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark lab.satisfying_assignment")
+    parser.add_argument("--mode", default='cdcl')
+    parser.add_argument("--heuristic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--select", help="only the cases whose name contains this")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parsed = parser.parse_args()
+
+    def report(name, case):
+        print("%-32s %-7s %9.4fs %10d bytes %8d conflicts"
+              % (name, case['result'], case['time'], case['peak_memory'],
+                 case['stats']['conflicts']), flush=True)
+
+    options = {'mode': parsed.mode, 'heuristic': parsed.heuristic}
+    results = run(options, parsed.seed, parsed.repeat, parsed.timeout, parsed.select, report)
+    if parsed.output:
+        with open(parsed.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if parsed.baseline:
+        with open(parsed.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, parsed.threshold)
+        for name, what, old, new in regressions:
+            print("REGRESSION %s %s: %s -> %s" % (name, what, old, new))
+        if regressions:
+            sys.exit(1)
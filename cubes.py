@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Cube-and-conquer: a lookahead pass splits a hard formula into many cubes
+(partial assignments that together cover every assignment the formula can
+have), and then the cubes are solved on their own, each by a CDCL search
+that assumes its literals. The formula is satisfiable exactly when one of
+its cubes is.
+
+The cubes go to a pool of worker processes through one shared work queue.
+Every worker takes the next cube whenever it's done with the last one, so
+a worker that got easy cubes just ends up solving more of them, and they
+all stop as soon as one cube turns out to be satisfiable.
+"""
+
+import multiprocessing
+import queue
+import traceback
+
+import lab
+
+
+def make_cubes(formula, depth=4, candidates=16):
+    """
+    Splits a formula (list of clauses of (variable, boolean) literals, or a
+    lab.CNF) into cubes by lookahead, down to depth decisions.
+
+    At every split, the candidates unassigned variables that appear in the
+    most clauses are tried both ways with unit propagation, and the one
+    whose two sides together assign the most (the product of the number of
+    literals each side assigns) is split on, as that is the variable that
+    simplifies both halves the most. A side that reaches a conflict has no
+    cubes at all, which also makes its variable the best one to split on.
+
+    Returns the list of cubes, each a list of (variable, boolean) literals
+    (the propagated literals are left out). An empty list means the formula
+    is unsatisfiable.
+    """
+    cnf = formula if isinstance(formula, lab.CNF) else lab.CNF.from_formula(formula)
+    lits, starts = cnf.lits, cnf.starts
+    vals = bytearray([lab.UNSET]) * (2*cnf.n)
+    trail = []
+
+    def assign(lit, clause=None):
+        vals[lit] = lab.TRUE
+        vals[lit ^ 1] = lab.FALSE
+        trail.append(lit)
+
+    def undo(pos):
+        for lit in trail[pos:]:
+            vals[lit] = vals[lit ^ 1] = lab.UNSET
+        del trail[pos:]
+
+    def propagate(lit):
+        # assigns lit and returns how many literals that assigned, or None
+        # on a conflict
+        pos = len(trail)
+        assign(lit)
+        if lab.propagate(lits, starts, watches, vals, trail, pos, assign)[1] is not None:
+            return None
+        return len(trail) - pos
+
+    watches = lab.watch_clauses(cnf, vals, assign)
+    if watches is None or lab.propagate(lits, starts, watches, vals, trail, 0, assign)[1] is not None:
+        return []
+
+    # variables by how many clauses they appear in
+    occurrences = [0] * cnf.n
+    for lit in lits:
+        occurrences[lit >> 1] += 1
+    order = sorted(range(cnf.n), key=lambda var: -occurrences[var])
+
+    cubes = []
+    def split(cube, depth):
+        free = [var for var in order if vals[2*var] == lab.UNSET][:candidates]
+        if depth == 0 or not free:
+            cubes.append([(cnf.names[lit >> 1], not lit & 1) for lit in cube])
+            return
+        best = None
+        for var in free:
+            pos = len(trail)
+            sides = []
+            for lit in (2*var, 2*var + 1):
+                sides.append(propagate(lit))
+                undo(pos)
+            if None in sides:
+                best = (var, sides)
+                break
+            if best is None or sides[0] * sides[1] > best[1][0] * best[1][1]:
+                best = (var, sides)
+        var, sides = best
+        # the side that assigns more goes first
+        for lit in sorted((2*var, 2*var + 1), key=lambda lit: -(sides[lit & 1] or 0)):
+            pos = len(trail)
+            if propagate(lit) is not None:
+                split(cube + [lit], depth - 1)
+            undo(pos)
+
+    split([], depth)
+    return cubes
+
+
+def _conquer(formula, options, tasks, results):
+    # one incremental Solver for every cube, so what it learns on one cube
+    # helps with the next
+    try:
+        solver = lab.Solver(formula, **options)
+        while True:
+            cube = tasks.get()
+            if cube is None:
+                return
+            results.put((True, solver.solve(assumptions=cube)))
+    except Exception:
+        results.put((False, traceback.format_exc()))
+
+
+def cube_and_conquer(formula, workers=None, depth=None, candidates=16, **options):
+    """
+    Solves a formula (list of clauses of (variable, boolean) literals, or a
+    lab.CNF) by cube-and-conquer. Returns a model as a dictionary, or None
+    if the formula is unsatisfiable, like lab.satisfying_assignment.
+
+    workers: number of worker processes, one per CPU core by default.
+    depth: how many decisions the cubes are made of (see make_cubes), by
+        default enough for about four cubes per worker.
+    options: passed on to the lab.Solver of every worker.
+
+    Raises a RuntimeError if a worker fails.
+    """
+    if isinstance(formula, lab.CNF):
+        formula = list(formula.clauses())
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if depth is None:
+        depth = (4*workers - 1).bit_length()
+    cubes = make_cubes(formula, depth, candidates)
+    if not cubes:
+        return None
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for cube in cubes:
+        tasks.put(cube)
+    workers = min(workers, len(cubes))
+    for _ in range(workers):
+        tasks.put(None)
+    processes = [multiprocessing.Process(target=_conquer, daemon=True,
+                                         args=(formula, options, tasks, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        for _ in cubes:
+            while True:
+                try:
+                    ok, result = results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    # a worker that got killed never reports back
+                    if not any(process.is_alive() for process in processes) and results.empty():
+                        raise RuntimeError("cube-and-conquer workers stopped without an answer")
+            if not ok:
+                raise RuntimeError("cube-and-conquer worker failed:\n" + result)
+            if result is not None:
+                return result
+        return None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        # cubes nobody is going to take anymore
+        tasks.cancel_join_thread()
+        tasks.close()
+        results.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import dimacs
+
+    parser = argparse.ArgumentParser(description="Solve a DIMACS CNF file by cube-and-conquer")
+    parser.add_argument("path")
+    parser.add_argument("--mapping")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--depth", type=int)
+    parsed = parser.parse_args()
+
+    cnf = dimacs.read_dimacs(parsed.path, parsed.mapping)
+    model = cube_and_conquer(cnf, workers=parsed.workers, depth=parsed.depth)
+    dimacs.print_result(model, cnf)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Reading and writing formulas in the DIMACS CNF format.
+
+A DIMACS file starts with a header "p cnf <variables> <clauses>" and then
+lists every clause as whitespace separated integers ending with 0, where k
+stands for variable k being True and -k for it being False. Lines starting
+with "c" are comments.
+
+Variables in DIMACS are numbers, so the names of a formula are kept in a
+separate mapping file: a JSON object from variable names to DIMACS ids.
+"""
+
+import json
+
+import lab
+
+
+# room left for the header of a formula whose size is only known at the end
+HEADER_WIDTH = 40
+
+
+def read_dimacs(path, mapping_path=None):
+    """
+    Reads a DIMACS file into a lab.CNF, one line at a time, without building
+    the list of clauses first. DIMACS variable k becomes variable k - 1 of the
+    CNF, so its literals can be stored without looking any name up.
+
+    Variables are named after their DIMACS id, unless a mapping file written
+    by write_dimacs is given.
+    """
+    names = {}
+    if mapping_path is not None:
+        with open(mapping_path) as f:
+            names = {var: name for name, var in json.load(f).items()}
+
+    cnf = lab.CNF()
+    clause = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] == 'c':
+                continue
+            if line[0] == '%':
+                # some benchmark collections end their files with "%\n0"
+                break
+            if line[0] == 'p':
+                declared = int(line.split()[2])
+                while cnf.n < declared:
+                    cnf.var(names.get(cnf.n + 1, str(cnf.n + 1)))
+                continue
+            for token in line.split():
+                x = int(token)
+                if x == 0:
+                    cnf.add_literals(clause)
+                    clause = []
+                    continue
+                # variables missing from the header get added as they come
+                while cnf.n < abs(x):
+                    cnf.var(names.get(cnf.n + 1, str(cnf.n + 1)))
+                clause.append(2*x - 2 if x > 0 else -2*x - 1)
+    # the last clause doesn't always end with a 0
+    if clause:
+        cnf.add_literals(clause)
+    return cnf
+
+
+def write_dimacs(formula, path, mapping_path=None):
+    """
+    Writes a formula (a list of clauses of (variable, boolean) literals, like
+    the output of boolify_scheduling_problem, or a lab.CNF) to a DIMACS file.
+    Variables are numbered from 1 in the order they first appear, and the
+    mapping from names to those numbers is written to mapping_path as JSON.
+
+    Any other iterable of clauses (like lab.scheduling_clauses) is written
+    as it comes, one clause at a time. Its header is then written last, over
+    a line of spaces left for it at the top, as the counts aren't known
+    before the end.
+    """
+    header = None
+    if isinstance(formula, lab.CNF):
+        ids = {name: v + 1 for v, name in enumerate(formula.names)}
+        clauses = formula.clauses()
+        header = 'p cnf %s %s' % (len(ids), len(formula))
+    elif isinstance(formula, list):
+        ids = {}
+        for clause in formula:
+            for var, val in clause:
+                if var not in ids:
+                    ids[var] = len(ids) + 1
+        clauses = formula
+        header = 'p cnf %s %s' % (len(ids), len(formula))
+    else:
+        ids = {}
+        clauses = formula
+
+    with open(path, 'w') as f:
+        f.write((header or ' ' * HEADER_WIDTH) + '\n')
+        count = 0
+        for clause in clauses:
+            literals = []
+            for var, val in clause:
+                if var not in ids:
+                    ids[var] = len(ids) + 1
+                literals.append(str(ids[var] if val else -ids[var]))
+            f.write(' '.join(literals) + ' 0\n')
+            count += 1
+        if header is None:
+            f.seek(0)
+            f.write(('p cnf %s %s' % (len(ids), count)).ljust(HEADER_WIDTH))
+
+    if mapping_path is not None:
+        with open(mapping_path, 'w') as f:
+            json.dump(ids, f)
+
+
+def print_result(model, cnf):
+    """
+    Prints the answer of a solver for cnf (a lab.CNF, as read_dimacs makes)
+    the way SAT competitions want it: "s SATISFIABLE" and the model as a
+    "v" line of DIMACS literals ending with 0, "s UNSATISFIABLE" for None,
+    or "s UNKNOWN" for lab.UNKNOWN.
+    """
+    if model is lab.UNKNOWN:
+        print("s UNKNOWN")
+    elif model is None:
+        print("s UNSATISFIABLE")
+    else:
+        ids = {name: v + 1 for v, name in enumerate(cnf.names)}
+        print("s SATISFIABLE")
+        print("v " + " ".join(str(ids[var] if val else -ids[var])
+                              for var, val in model.items()) + " 0")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Solve a DIMACS CNF file")
+    parser.add_argument("path")
+    parser.add_argument("--mapping")
+    parser.add_argument("--mode", default='cdcl')
+    parser.add_argument("--heuristic")
+    parser.add_argument("--timeout", type=float)
+    parsed = parser.parse_args()
+
+    cnf = read_dimacs(parsed.path, parsed.mapping)
+    budget = lab.Budget(timeout=parsed.timeout)
+    model = lab.satisfying_assignment(cnf, mode=parsed.mode, heuristic=parsed.heuristic,
+                                      budget=budget)
+    print_result(model, cnf)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Reading formulas in the JSON format of test_inputs: a list of clauses,
+each a list of [variable name, boolean] literals.
+
+json.load turns a big formula into a list of lists for every literal
+before anything else can use it. read_json_cnf instead scans the file
+through mmap, straight into a lab.CNF. It decodes every variable name once
+however often it appears, and never builds anything but the CNF itself.
+
+The scheduling problems of test_inputs are JSON files too, a list of two
+objects, which json_kind tells apart from formulas by their first bytes.
+"""
+
+import json
+import mmap
+import re
+
+import lab
+
+
+STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+PAIR = rb'\[\s*' + STRING + rb'\s*,\s*(?:true|false)\s*\]'
+# a clause, with its [name, boolean] literals in the group
+CLAUSE = re.compile(rb'\s*\[\s*((?:' + PAIR + rb'(?:\s*,\s*' + PAIR + rb')*)?)\s*\]')
+# what comes before the first clause, between two of them, and after the last
+START = re.compile(rb'\s*\[')
+COMMA = re.compile(rb'\s*,')
+END = re.compile(rb'\s*\]\s*\Z')
+# a literal in a clause, as its name and the first letter of its boolean
+LITERAL = re.compile(rb'(' + STRING + rb')\s*,\s*(t|f)')
+WHITESPACE = b' \t\r\n'
+
+
+def json_kind(path):
+    """
+    Whether the JSON file at path holds a 'formula' or a 'scheduling'
+    problem, from its first few bytes (None if it's neither)
+    """
+    with open(path, 'rb') as f:
+        start = f.read(256).lstrip(WHITESPACE)
+    if start[:1] != b'[':
+        return None
+    return {b'[': 'formula', b'{': 'scheduling'}.get(start[1:].lstrip(WHITESPACE)[:1])
+
+
+def read_json_cnf(path, cnf=None):
+    """
+    Reads the formula in the JSON file at path into cnf (a new lab.CNF by
+    default), and returns it. Raises ValueError if the file isn't a list of
+    clauses of [name, boolean] literals, with nothing after it.
+    """
+    if cnf is None:
+        cnf = lab.CNF()
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            raise ValueError("%s: not a formula, empty file" % path) from None
+    with data:
+        start = START.match(data)
+        if start is None:
+            raise ValueError("%s: not a formula, no [ at the start" % path)
+        # every clause has to start right where the one before it ended
+        pos = start.end()
+        # literal of every (name, boolean) as they're written in the file
+        literals = {}
+        while not END.match(data, pos):
+            if pos > start.end():
+                comma = COMMA.match(data, pos)
+                if comma is None:
+                    raise ValueError("%s: not a formula, expected , at byte %d" % (path, pos))
+                pos = comma.end()
+            clause = CLAUSE.match(data, pos)
+            if clause is None:
+                raise ValueError("%s: not a formula, expected a clause at byte %d" % (path, pos))
+            pos = clause.end()
+            ints = []
+            for literal in LITERAL.findall(clause.group(1)):
+                lit = literals.get(literal)
+                if lit is None:
+                    name, val = literal
+                    var = cnf.var(json.loads(name) if b'\\' in name else name[1:-1].decode())
+                    lit = literals[literal] = 2*var + (val == b'f')
+                ints.append(lit)
+            cnf.add_literals(ints)
+    return cnf
@@ -2,10 +2,16 @@
 """6.009 Lab 5 -- Boolean satisfiability solving"""
 
 import sys
+import time
 import typing
 import doctest
-sys.setrecursionlimit(10000)
-# NO ADDITIONAL IMPORTS
+import threading
+import os
+import pickle
+import hashlib
+import tempfile
+from array import array
+from collections import OrderedDict
 
 def parse_formula(formula):
     """
@@ -70,17 +76,20 @@ def parse_formula(formula):
     for clause in formula:
         # dictionary that holds new clause representation
         n_clause = {}
+        # whether the clause has a variable both ways, so that it always holds
+        tautology = False
         for literal in clause:
             # for irrelevancies: if the current variables has not been seen...
             if literal[0] not in n_clause:
                 # add it to the new clause representation
                 n_clause[literal[0]] = literal[1]
             # if the literal has been seen and can be either True or False,
-            # then its value does not affect clause so delete it
+            # then the clause is always satisfied
             elif literal[1] != n_clause[literal[0]]:
-                del n_clause[literal[0]]
-        # if the new clause is not empty, add it to the new formula representation
-        if n_clause != {}:
+                tautology = True
+        # if the clause can be false, add it to the new formula representation
+        # (an empty one can never be true, which the search checks first)
+        if not tautology:
             n_formula[n] = n_clause
         # keep track of how many clauses we've seen
         n += 1
@@ -150,10 +159,1954 @@ def switch_keys(assignment, state, variables, indices, assigned, index):
 
     variables[assigned], variables[index] = variables[index], variables[assigned]
 
-def satisfying_assignment(formula):
+# values a literal can have in the assignment bytearray of the searches
+FALSE, TRUE, UNSET = 0, 1, 2
+
+class CNF:
+    """
+    Compact representation of a CNF formula used by the searches.
+
+    Variable names are interned once into dense indices (names[v] is the
+    name of variable v and ids[name] its index). A literal is an integer:
+    variable v becomes 2*v when it has to be True and 2*v + 1 when it has to
+    be False, so the negation of a literal l is always l ^ 1 and its variable
+    is l >> 1. All clauses live next to each other in one flat array('i') of
+    literals, and clause i spans lits[starts[i]:starts[i+1]].
+
+    Names only come back at the boundary, in model().
+
+    >>> cnf = CNF.from_formula([[('a', True), ('b', False)], [('b', True)]])
+    >>> cnf.names, list(cnf.lits), list(cnf.starts)
+    (['a', 'b'], [0, 3, 2], [0, 2, 3])
+    """
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.lits = array('i')
+        self.starts = array('i', [0])
+
+    @classmethod
+    def from_formula(cls, formula):
+        """
+        Builds the compact representation of a formula given as a list of
+        clauses of (variable, boolean) literals, or as the dictionary of
+        clause dictionaries that parse_formula makes
+        """
+        if isinstance(formula, dict):
+            formula = (clause.items() for clause in formula.values())
+        cnf = cls()
+        for clause in formula:
+            cnf.add_clause(clause)
+        return cnf
+
+    @property
+    def n(self):
+        """
+        Number of variables
+        """
+        return len(self.names)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def var(self, name):
+        """
+        Index of the variable with the given name, interning it if it's new
+        """
+        var = self.ids.get(name)
+        if var is None:
+            var = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return var
+
+    def add_clause(self, clause):
+        """
+        Adds a clause given as (variable, boolean) literals. Repeated literals
+        are only kept once, and a clause with both literals of a variable is
+        always satisfied, so it isn't added at all.
+        """
+        ids = self.ids
+        literals = []
+        for name, val in clause:
+            var = ids.get(name)
+            if var is None:
+                var = self.var(name)
+            literals.append(2*var + (0 if val else 1))
+        self.add_literals(literals)
+
+    def add_literals(self, literals):
+        """
+        Same as add_clause, but for a clause that's already made of integer
+        literals
+        """
+        unique = dict.fromkeys(literals)
+        for lit in unique:
+            if lit ^ 1 in unique:
+                return
+        self.lits.extend(unique)
+        self.starts.append(len(self.lits))
+
+    def append(self, literals):
+        """
+        Adds a clause of distinct integer literals as is, and returns its index
+        """
+        self.lits.extend(literals)
+        self.starts.append(len(self.lits))
+        return len(self.starts) - 2
+
+    def clause(self, i):
+        """
+        Literals of clause i
+        """
+        return self.lits[self.starts[i]:self.starts[i+1]]
+
+    def clauses(self):
+        """
+        Generator over the clauses as lists of (variable, boolean) literals
+        """
+        names, lits, starts = self.names, self.lits, self.starts
+        for i in range(len(self)):
+            yield [(names[lit >> 1], not lit & 1) for lit in lits[starts[i]:starts[i+1]]]
+
+    def model(self, vals):
+        """
+        Given the assignment bytearray of a search, returns the dictionary
+        from variable names to booleans
+        """
+        return {name: vals[2*v] == TRUE for v, name in enumerate(self.names)}
+
+class Stats:
+    """
+    What a solve did. satisfying_assignment and the searches fill one in
+    when they're given one:
+        decisions: variables assigned by a decision
+        propagations: variables assigned by unit propagation
+        conflicts: times every literal of a clause became False
+        backtracks: times assignments were undone after a conflict
+        restarts: restarts of the 'cdcl' mode (see Solver)
+        max_depth: highest decision level reached (in 'copy' mode, where
+            every assignment gets a copy of the formula of its own, the
+            most variables assigned at once)
+        peak_size: most clause literals kept at once (the formula with its
+            learned clauses, or all the copies of it in 'copy' mode)
+        times: seconds spent in every phase of the solve, by name
+
+    progress, if given, is called with the Stats every progress_interval
+    conflicts while a search runs. The searches only look at it once per
+    conflict, so leaving it off costs nothing.
+
+    >>> stats = Stats()
+    >>> formula = [[('a', True), ('b', True)], [('a', False), ('b', True)], [('a', True), ('b', False)]]
+    >>> satisfying_assignment(formula, fast_paths=False, decomposition=False, stats=stats)
+    {'a': True, 'b': True}
+    >>> stats.decisions, stats.propagations, stats.conflicts, stats.backtracks
+    (1, 2, 1, 1)
+    """
+    def __init__(self, progress=None, progress_interval=1000):
+        self.decisions = 0
+        self.propagations = 0
+        self.conflicts = 0
+        self.backtracks = 0
+        self.restarts = 0
+        self.max_depth = 0
+        self.peak_size = 0
+        self.times = {}
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    def lap(self, phase, start):
+        """
+        Adds the time since start (from time.perf_counter) to phase, and
+        returns the current time, where the next phase starts
+        """
+        now = time.perf_counter()
+        self.add_time(phase, now - start)
+        return now
+
+    def as_dict(self):
+        """
+        Every counter in a dictionary, e.g. to send it as JSON
+        """
+        return {'decisions': self.decisions, 'propagations': self.propagations,
+                'conflicts': self.conflicts, 'backtracks': self.backtracks,
+                'restarts': self.restarts, 'max_depth': self.max_depth,
+                'peak_size': self.peak_size, 'times': dict(self.times)}
+
+    def __repr__(self):
+        return 'Stats(%s)' % ', '.join('%s=%r' % item for item in self.as_dict().items())
+
+class _Unknown:
+    """
+    Type of UNKNOWN, which there is only one of
+    """
+    def __repr__(self):
+        return 'UNKNOWN'
+
+    def __reduce__(self):
+        # unpickles as the same UNKNOWN, even in another process
+        return 'UNKNOWN'
+
+# what a solve returns when it runs out of budget (see Budget), unlike None,
+# which means that there is no model
+UNKNOWN = _Unknown()
+
+class Budget:
+    """
+    Limits on a single solve:
+        timeout: seconds of wall-clock time
+        max_conflicts: conflicts (see Stats)
+        max_decisions: decisions (see Stats)
+        max_size: clause literals kept at once (see Stats.peak_size), which
+            bounds the memory the copies of the formula take in 'copy' mode,
+            and the learned clauses otherwise
+
+    Limits count from the first time a search looks at the budget. The
+    searches look before every decision, and return UNKNOWN as soon as a
+    limit is hit, with reason set to 'timeout', 'conflicts', 'decisions',
+    'size' or 'cancelled'.
+
+    cancel() can be called from any other thread (the one handling a
+    request, for example) and stops the solve the next time it looks.
+
+    >>> budget = Budget(timeout=60)
+    >>> budget.cancel()
+    >>> formula = [[('a', True), ('b', True)], [('a', False), ('b', False)]]
+    >>> satisfying_assignment(formula, fast_paths=False, decomposition=False, budget=budget)
+    UNKNOWN
+    >>> budget.reason
+    'cancelled'
+    """
+    def __init__(self, timeout=None, max_conflicts=None, max_decisions=None, max_size=None):
+        self.timeout = timeout
+        self.max_conflicts = max_conflicts
+        self.max_decisions = max_decisions
+        self.max_size = max_size
+        self.cancelled = threading.Event()
+        self.reason = None
+        self.started = False
+
+    def cancel(self):
+        """
+        Asks the solve to stop
+        """
+        self.cancelled.set()
+
+    def start(self, stats):
+        """
+        Starts the clock, and the counts from what stats has counted so far
+        """
+        if self.started:
+            return
+        self.started = True
+        self.deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self.conflicts = stats.conflicts
+        self.decisions = stats.decisions
+
+    def exhausted(self, stats):
+        """
+        Whether the solve counted by stats has to stop now
+        """
+        if self.cancelled.is_set():
+            self.reason = 'cancelled'
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = 'timeout'
+        elif self.max_conflicts is not None and stats.conflicts - self.conflicts >= self.max_conflicts:
+            self.reason = 'conflicts'
+        elif self.max_decisions is not None and stats.decisions - self.decisions >= self.max_decisions:
+            self.reason = 'decisions'
+        elif self.max_size is not None and stats.peak_size > self.max_size:
+            self.reason = 'size'
+        return self.reason is not None
+
+class IndexOrder:
+    """
+    Branching heuristic that decides variables in index order (the order in
+    which they first appear in the formula), False first. This is the order
+    the copying search uses.
+
+    Every heuristic is built from the CNF, and the searches talk to it
+    through four methods:
+        pick(vals): literal to decide next, or None if every variable is assigned
+        unassign(lit): lit was undone by a backtrack
+        bump(var): var took part in a conflict
+        decay(): called once after every conflict
+    plus add_variable(), which the incremental Solver calls for every
+    variable the CNF gets after the heuristic was built.
+
+    With phase_saving, a variable is decided with the value it had the last
+    time it was assigned instead of the heuristic's own choice.
+    """
+    def __init__(self, cnf, phase_saving=False):
+        self.n = cnf.n
+        self.phase_saving = phase_saving
+        # saved value of every variable, or None if it has never been assigned
+        self.phase = [None] * self.n
+        # every variable below next_var is assigned
+        self.next_var = 0
+
+    def literal(self, var, value):
+        """
+        Literal that decides var, preferring its saved phase over value
+        """
+        if self.phase_saving and self.phase[var] is not None:
+            value = self.phase[var]
+        return 2*var + (0 if value else 1)
+
+    def pick(self, vals):
+        while self.next_var < self.n and vals[2*self.next_var] != UNSET:
+            self.next_var += 1
+        if self.next_var == self.n:
+            return None
+        return self.literal(self.next_var, False)
+
+    def unassign(self, lit):
+        self.phase[lit >> 1] = not lit & 1
+        self.next_var = min(self.next_var, lit >> 1)
+
+    def add_variable(self):
+        self.phase.append(None)
+        self.n += 1
+
+    def bump(self, var):
+        pass
+
+    def decay(self):
+        pass
+
+class JeroslowWang(IndexOrder):
+    """
+    Two-sided Jeroslow-Wang: every literal scores 2^-|C| for every clause C it
+    appears in, and variables are decided from the highest to the lowest
+    combined score of their two literals, with the value of the literal that
+    scores higher. Scores come from the original formula, so the order never
+    changes during the search.
+    """
+    def __init__(self, cnf, phase_saving=False):
+        super().__init__(cnf, phase_saving)
+        n, lits, starts = self.n, cnf.lits, cnf.starts
+        score = [0.0] * (2*n)
+        for c in range(len(cnf)):
+            weight = 2.0 ** (starts[c] - starts[c+1])
+            for k in range(starts[c], starts[c+1]):
+                score[lits[k]] += weight
+        # variables from best to worst, and where each of them is in that order
+        self.order = sorted(range(n), key=lambda v: -(score[2*v] + score[2*v+1]))
+        self.rank = [0] * n
+        for i, var in enumerate(self.order):
+            self.rank[var] = i
+        self.value = [score[2*v] >= score[2*v+1] for v in range(n)]
+
+    def pick(self, vals):
+        # next_var is a position in self.order here
+        while self.next_var < self.n and vals[2*self.order[self.next_var]] != UNSET:
+            self.next_var += 1
+        if self.next_var == self.n:
+            return None
+        var = self.order[self.next_var]
+        return self.literal(var, self.value[var])
+
+    def unassign(self, lit):
+        self.phase[lit >> 1] = not lit & 1
+        self.next_var = min(self.next_var, self.rank[lit >> 1])
+
+    def add_variable(self):
+        # new variables haven't been scored, so they come last
+        super().add_variable()
+        self.rank.append(len(self.order))
+        self.order.append(self.n - 1)
+        self.value.append(False)
+
+class MOMS(IndexOrder):
+    """
+    Maximum Occurrences in clauses of Minimum Size. Every decision looks at
+    the clauses that aren't satisfied yet, keeps the ones with the fewest
+    unassigned literals, and picks the variable that appears the most in
+    them, scored as (f(x) + f(not x)) * 2^k + f(x) * f(not x) with k = 10.
+    The variable gets the value of its more frequent literal.
+
+    Each decision goes through the whole formula, so this is meant for the
+    non-learning search where it can save many decisions.
+    """
+    def __init__(self, cnf, phase_saving=False):
+        super().__init__(cnf, phase_saving)
+        self.cnf = cnf
+
+    def pick(self, vals):
+        lits, starts = self.cnf.lits, self.cnf.starts
+        smallest = None
+        counts = {}
+        for c in range(len(self.cnf)):
+            free = []
+            for k in range(starts[c], starts[c+1]):
+                if vals[lits[k]] == TRUE:
+                    break
+                if vals[lits[k]] == UNSET:
+                    free.append(lits[k])
+            else:
+                if not free or (smallest is not None and len(free) > smallest):
+                    continue
+                if smallest is None or len(free) < smallest:
+                    smallest = len(free)
+                    counts = {}
+                for lit in free:
+                    counts[lit] = counts.get(lit, 0) + 1
+        if not counts:
+            # every clause is satisfied, so whatever is left can be anything
+            return super().pick(vals)
+        best = None
+        for lit in counts:
+            pos, neg = counts.get(lit & ~1, 0), counts.get(lit | 1, 0)
+            score = (pos + neg) * 1024 + pos * neg
+            if best is None or score > best[0]:
+                best = (score, lit >> 1, pos >= neg)
+        return self.literal(best[1], best[2])
+
+class VSIDS(IndexOrder):
+    """
+    Exponential variable state independent decaying sum. Every variable has
+    an activity that grows whenever it takes part in a conflict, and the
+    amount added grows after every conflict, so recent conflicts count the
+    most. Unassigned variables are kept in a binary max-heap on activity, so
+    picking the most active one is O(log n). Phase saving is on by default.
+    """
+    def __init__(self, cnf, phase_saving=True, decay=0.95):
+        super().__init__(cnf, phase_saving)
+        self.activity = [0.0] * self.n
+        self.increment = 1.0
+        self.factor = 1 / decay
+        # heap of variables, and where each variable is in it (-1 if it isn't)
+        self.heap = list(range(self.n))
+        self.where = list(range(self.n))
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.where[heap[i]] = i
+        self.where[heap[j]] = j
+
+    def _up(self, i):
+        activity, heap = self.activity, self.heap
+        while i > 0 and activity[heap[(i-1) // 2]] < activity[heap[i]]:
+            self._swap(i, (i-1) // 2)
+            i = (i-1) // 2
+
+    def _down(self, i):
+        activity, heap = self.activity, self.heap
+        while True:
+            best = i
+            for child in (2*i + 1, 2*i + 2):
+                if child < len(heap) and activity[heap[child]] > activity[heap[best]]:
+                    best = child
+            if best == i:
+                return
+            self._swap(i, best)
+            i = best
+
+    def pick(self, vals):
+        heap = self.heap
+        while heap:
+            var = heap[0]
+            # take the top of the heap out
+            self._swap(0, len(heap) - 1)
+            heap.pop()
+            self.where[var] = -1
+            self._down(0)
+            if vals[2*var] == UNSET:
+                return self.literal(var, False)
+        return None
+
+    def unassign(self, lit):
+        var = lit >> 1
+        self.phase[var] = not lit & 1
+        if self.where[var] == -1:
+            self.heap.append(var)
+            self.where[var] = len(self.heap) - 1
+            self._up(len(self.heap) - 1)
+
+    def add_variable(self):
+        super().add_variable()
+        self.activity.append(0.0)
+        self.heap.append(self.n - 1)
+        self.where.append(len(self.heap) - 1)
+
+    def bump(self, var):
+        self.activity[var] += self.increment
+        if self.activity[var] > 1e100:
+            # scale everything down before the floats overflow
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.increment *= 1e-100
+        if self.where[var] != -1:
+            self._up(self.where[var])
+
+    def decay(self):
+        self.increment *= self.factor
+
+# branching heuristics that can be picked by name
+HEURISTICS = {
+    'order': IndexOrder,
+    'jw': JeroslowWang,
+    'moms': MOMS,
+    'vsids': VSIDS,
+}
+
+def watch_clauses(cnf, vals, assign):
+    """
+    Sets up the two watched literals of every clause of the CNF (see
+    propagate) and assigns the literal of every clause that only has one.
+
+    Returns the watch lists, where watches[l] holds the indices of the
+    clauses watching literal l, or None if the formula has an empty clause
+    or two unit clauses that contradict each other.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    watches = [[] for _ in range(2*cnf.n)]
+    for c in range(len(cnf)):
+        size = starts[c+1] - starts[c]
+        if size == 0:
+            return None
+        if size == 1:
+            lit = lits[starts[c]]
+            if vals[lit] == FALSE:
+                return None
+            if vals[lit] == UNSET:
+                assign(lit)
+        else:
+            watches[lits[starts[c]]].append(c)
+            watches[lits[starts[c] + 1]].append(c)
+    return watches
+
+def propagate(lits, starts, watches, vals, trail, head, assign):
+    """
+    Unit propagation with two watched literals. The first two literals of
+    every clause with at least two literals are watched, and a clause is only
+    looked at when one of its watched literals becomes false. It then either
+    finds another literal that isn't false to watch, or the clause is unit
+    (or empty) under the current assignment. Backtracking never has to touch
+    the watches.
+
+    lits and starts are the flat clause storage of a CNF, watches[l] holds
+    the clauses watching literal l and vals the assignment of every literal.
+    Goes through the trail starting at position head and calls
+    assign(literal, clause) for every implied literal, where clause is the
+    index of the clause that forced it (with the implied literal moved to
+    the front).
+
+    Returns the new head together with the index of the clause that has
+    every literal false, or None if no conflict was reached.
+    """
+    # local names are faster to look up in the loop
+    true, false = TRUE, FALSE
+    while head < len(trail):
+        false_lit = trail[head] ^ 1
+        head += 1
+        watching = watches[false_lit]
+        size = len(watching)
+        # clauses that keep watching false_lit are moved to the front
+        kept = 0
+        i = 0
+        while i < size:
+            c = watching[i]
+            i += 1
+            start = starts[c]
+            # make sure the false literal is the second watch
+            other = lits[start]
+            if other == false_lit:
+                other = lits[start] = lits[start + 1]
+                lits[start + 1] = false_lit
+            if vals[other] == true:
+                # clause is already satisfied by the other watch
+                watching[kept] = c
+                kept += 1
+                continue
+            # look for another literal that isn't false to watch instead
+            for k in range(start + 2, starts[c + 1]):
+                lit = lits[k]
+                if vals[lit] != false:
+                    lits[start + 1] = lit
+                    lits[k] = false_lit
+                    watches[lit].append(c)
+                    break
+            else:
+                # no replacement, so the clause keeps watching false_lit
+                watching[kept] = c
+                kept += 1
+                if vals[other] == false:
+                    # every literal is false. Keep the clauses we haven't
+                    # visited yet and report the conflict.
+                    watching[kept:] = watching[i:size]
+                    return head, c
+                # only the other watch is left, so it has to be true
+                assign(other, c)
+        del watching[kept:]
+    return head, None
+
+def trail_search(cnf, heuristic=None, stats=None, budget=None):
+    """
+    Runs the same chronological search as satisfying_assignment, but on a
+    single formula that is never copied. Every assignment is pushed onto a
+    trail, and every decision records where its level starts on the trail,
+    so backtracking only undoes the assignments made since that decision.
+
+    Unit propagation uses two watched literals (see propagate).
+
+    cnf: the formula (see CNF). The literals inside each clause get reordered.
+    heuristic: branching heuristic (see IndexOrder), index order by default.
+        Variables of a clause that became false get bumped.
+    stats: Stats to count into.
+    budget: Budget that stops the search.
+
+    Returns the assignment bytearray (see CNF.model), None if the formula
+    is unsatisfiable, or UNKNOWN if the budget ran out first.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    # vals[l] is TRUE, FALSE or UNSET for every literal l
+    vals = bytearray([UNSET]) * (2*cnf.n)
+    # assignments in the order they were made
+    trail = []
+    # trail position where every decision level starts, and for every
+    # decision whether its other value has already been tried
+    levels = []
+    flipped = []
+    # position on the trail of the next assignment to propagate
+    head = 0
+    if heuristic is None:
+        heuristic = IndexOrder(cnf)
+    if stats is None:
+        stats = Stats()
+    progress = stats.progress
+    stats.peak_size = max(stats.peak_size, len(lits))
+    if budget is not None:
+        budget.start(stats)
+
+    def assign(lit, reason=None):
+        vals[lit] = TRUE
+        vals[lit ^ 1] = FALSE
+        trail.append(lit)
+
+    def undo(pos):
+        # unassign everything that was assigned after the trail position
+        for lit in trail[pos:]:
+            vals[lit] = vals[lit ^ 1] = UNSET
+            heuristic.unassign(lit)
+        del trail[pos:]
+
+    watches = watch_clauses(cnf, vals, assign)
+    if watches is None:
+        return None
+
+    while True:
+        # propagate every assignment we haven't looked at yet
+        before = len(trail)
+        head, conflict = propagate(lits, starts, watches, vals, trail, head, assign)
+        stats.propagations += len(trail) - before
+
+        if conflict is not None:
+            stats.conflicts += 1
+            if progress is not None and stats.conflicts % stats.progress_interval == 0:
+                progress(stats)
+            for k in range(starts[conflict], starts[conflict + 1]):
+                heuristic.bump(lits[k] >> 1)
+            heuristic.decay()
+            # go back to the last decision whose other value hasn't been tried
+            while levels:
+                pos = levels.pop()
+                lit = trail[pos]
+                undo(pos)
+                if not flipped.pop():
+                    levels.append(pos)
+                    flipped.append(True)
+                    assign(lit ^ 1)
+                    break
+            else:
+                # can't backtrack further. No solutions.
+                return None
+            stats.backtracks += 1
+            head = len(trail) - 1
+            continue
+
+        if budget is not None and budget.exhausted(stats):
+            return UNKNOWN
+        lit = heuristic.pick(vals)
+        if lit is None:
+            return vals
+        levels.append(len(trail))
+        flipped.append(False)
+        assign(lit)
+        stats.decisions += 1
+        if len(levels) > stats.max_depth:
+            stats.max_depth = len(levels)
+
+def analyze(cnf, conflict, trail, level, reason, current, bump):
+    """
+    First-UIP conflict analysis. Starting from the conflict clause, resolves
+    away the literals assigned at the current decision level (walking the
+    trail backwards and using the clause that forced each of them) until only
+    one of them is left, the first unique implication point.
+
+    level[v] is the decision level of variable v and reason[v] the index of
+    the clause that forced it (None for decisions), with the forced literal
+    first. bump(v) is called for every variable that takes part in the
+    analysis.
+
+    Returns the learned clause, whose first literal is the negation of the
+    first UIP and whose second literal (if any) has the highest level among
+    the rest, together with the level to backjump to.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    # variables already looked at
+    seen = set()
+    # literals of the learned clause from levels below the current one
+    learned = [None]
+    # literals of the current level that still have to be resolved away
+    pending = 0
+    c = conflict
+    lit = None
+    pos = len(trail) - 1
+    while True:
+        # the first literal of a reason clause is the one we're resolving on
+        for k in range(starts[c] + (lit is not None), starts[c + 1]):
+            var = lits[k] >> 1
+            if var not in seen and level[var] > 0:
+                seen.add(var)
+                bump(var)
+                if level[var] == current:
+                    pending += 1
+                else:
+                    learned.append(lits[k])
+        # the next literal to resolve on is the latest one we've seen
+        while trail[pos] >> 1 not in seen:
+            pos -= 1
+        lit = trail[pos]
+        pos -= 1
+        pending -= 1
+        if pending == 0:
+            break
+        c = reason[lit >> 1]
+    learned[0] = lit ^ 1
+
+    if len(learned) == 1:
+        return learned, 0
+    # watch the literal that will be unassigned last
+    best = max(range(1, len(learned)), key=lambda i: level[learned[i] >> 1])
+    learned[1], learned[best] = learned[best], learned[1]
+    return learned, level[learned[1] >> 1]
+
+def luby(i):
+    """
+    Element i (from 0) of the Luby sequence 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...,
+    which restarts based on it are spaced by.
+
+    >>> [luby(i) for i in range(15)]
+    [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+    """
+    # find the smallest complete subsequence 1 .. 2^power that contains i
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2*size + 1
+    # and go down into the copy of the subsequence before it that i is in
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        power -= 1
+        i = i % size
+    return 1 << power
+
+# conflicts that the recent LBD average of glucose restarts is taken over,
+# and how much lower than the overall average it may get before a restart
+GLUCOSE_WINDOW = 50
+GLUCOSE_MARGIN = 0.8
+
+# how much the learned clause budget grows after every reduction
+CLAUSE_BUDGET_GROWTH = 1.1
+
+class Solver:
+    """
+    Incremental conflict-driven clause learning. Propagation works like in
+    trail_search, but when a conflict is reached, the clause returned by
+    analyze is added to the formula and the search jumps back to the highest
+    level where that clause becomes unit, instead of flipping the last
+    decision.
+
+    The solver keeps everything between calls to solve: learned clauses,
+    the heuristic's activities and saved phases, and what is known at level
+    0. Clauses can be added between calls, and solve can take assumptions,
+    literals that only have to hold for that call. Each assumption is
+    decided on a level of its own before any other decision, so every
+    learned clause still follows from the clauses alone and stays valid for
+    later calls.
+
+    push() opens a group of clauses that pop() removes again. Every group
+    has an activation variable: clauses added while the group is open get
+    its negation, every solve assumes it, and pop makes it False for good,
+    which satisfies the clauses of the group and every clause learned from
+    them.
+
+    Restarts undo every decision (but keep learned clauses, activities and
+    phases), which gets the search out of bad early decisions:
+        'luby': after restart_interval times luby(i) conflicts for the i-th
+            restart
+        'glucose': when the LBD of the last GLUCOSE_WINDOW learned clauses
+            is high compared to the average so far, i.e. when the search
+            stopped learning useful clauses
+        None: never
+
+    The LBD (literal block distance) of a learned clause is the number of
+    decision levels among its literals. Clauses with a low LBD tie few
+    levels together and tend to stay useful. Whenever more than
+    clause_budget learned clauses are kept, the next restart (or the next
+    decision, without restarts) brings them down to half of that, keeping
+    the ones with the lowest LBD (see reduce). Within one search, the budget
+    grows by CLAUSE_BUDGET_GROWTH after every reduction, as a search that
+    keeps forgetting what it needs would never end, and every call to
+    solve starts from clause_budget again.
+
+    formula: list of clauses of (variable, boolean) literals, or a CNF,
+        which is then used as is: added to, and rewritten by reduce.
+    heuristic: name from HEURISTICS, or a heuristic already built for the
+        CNF (see IndexOrder). Every variable that takes part in a conflict
+        analysis gets bumped.
+    phase_saving: passed on to the heuristic when it's given by name.
+    restarts, restart_interval, clause_budget: see above.
+    exchange: for solvers working on the same formula side by side (see
+        portfolio.py), an object whose export(clause) gets every learned
+        clause as integer literals and whose collect() returns the clauses
+        to add from elsewhere, which happens at every restart.
+    stats: Stats that every search of the solver counts into, a new one
+        by default.
+
+    >>> solver = Solver([[('a', True), ('b', True)], [('a', False), ('c', True)]])
+    >>> solver.solve(assumptions=[('c', False)])
+    {'a': False, 'b': True, 'c': False}
+    >>> solver.push()
+    >>> solver.add_clause([('b', False)])
+    >>> solver.solve(assumptions=[('c', False)]) is None
+    True
+    >>> solver.pop()
+    >>> solver.solve(assumptions=[('c', False)]) is None
+    False
+    """
+    def __init__(self, formula=(), heuristic='vsids', phase_saving=None,
+                 restarts='glucose', restart_interval=100, clause_budget=2000,
+                 exchange=None, stats=None):
+        if restarts not in ('luby', 'glucose', None):
+            raise ValueError("unknown restart policy: %s" % restarts)
+        self.restarts = restarts
+        self.restart_interval = restart_interval
+        self.clause_budget = clause_budget
+        self.exchange = exchange
+        self.stats = Stats() if stats is None else stats
+        # number of restarts so far
+        self.restart_count = 0
+        # LBD of every learned clause that is kept, by clause index
+        self.learned = {}
+        cnf = formula if isinstance(formula, CNF) else CNF.from_formula(formula)
+        self.cnf = cnf
+        n = cnf.n
+        # vals[l] is TRUE, FALSE or UNSET for every literal l
+        self.vals = vals = bytearray([UNSET]) * (2*n)
+        # decision level of every variable and clause that forced it
+        self.level = level = array('i', [0]) * n
+        self.reason = reason = [None] * n
+        # assignments in the order they were made
+        self.trail = trail = []
+        # trail position where every decision level starts
+        self.levels = levels = []
+        self.head = 0
+        if isinstance(heuristic, str):
+            options = {} if phase_saving is None else {'phase_saving': phase_saving}
+            heuristic = HEURISTICS[heuristic](cnf, **options)
+        self.heuristic = heuristic
+        # activation literal of every open group, and names of all of them
+        self.groups = []
+        self.activation = set()
+
+        # the arrays only ever grow in place, so this keeps seeing them
+        def assign(lit, clause=None):
+            vals[lit] = TRUE
+            vals[lit ^ 1] = FALSE
+            level[lit >> 1] = len(levels)
+            reason[lit >> 1] = clause
+            trail.append(lit)
+        self.assign = assign
+
+        self.watches = watch_clauses(cnf, vals, assign)
+        # set once the clauses are known to be unsatisfiable
+        self.unsat = self.watches is None
+        if self.unsat:
+            self.watches = [[] for _ in range(2*n)]
+
+    def _grow(self):
+        """
+        Makes room for the variables the CNF got since the last call
+        """
+        new = self.cnf.n - len(self.level)
+        if new:
+            self.vals.extend(bytearray([UNSET]) * (2*new))
+            self.level.extend(array('i', [0]) * new)
+            self.reason.extend([None] * new)
+            self.watches.extend([] for _ in range(2*new))
+            for _ in range(new):
+                self.heuristic.add_variable()
+
+    def _literals(self, clause):
+        cnf = self.cnf
+        literals = [2*cnf.var(name) + (0 if val else 1) for name, val in clause]
+        self._grow()
+        return literals
+
+    def backtrack(self, back=0):
+        """
+        Undoes every decision level above back
+        """
+        levels, trail, vals = self.levels, self.trail, self.vals
+        if back < len(levels):
+            pos = levels[back]
+            for lit in trail[pos:]:
+                vals[lit] = vals[lit ^ 1] = UNSET
+                self.heuristic.unassign(lit)
+            del trail[pos:]
+            del levels[back:]
+            self.head = min(self.head, pos)
+
+    def add_clause(self, clause):
+        """
+        Adds a clause of (variable, boolean) literals. While a group is open,
+        the clause only lasts until the group is popped.
+        """
+        literals = self._literals(clause)
+        if self.groups:
+            literals.append(self.groups[-1] ^ 1)
+        self.backtrack()
+        self.add_literals(literals)
+
+    def add_literals(self, literals, learned=False):
+        """
+        Adds a clause of integer literals at level 0, as a learned clause
+        that reduce may forget again when learned is set
+        """
+        unique = dict.fromkeys(literals)
+        vals = self.vals
+        if self.unsat or any(lit ^ 1 in unique or vals[lit] == TRUE for lit in unique):
+            # always satisfied, or nothing to add to
+            return
+        # literals that are False at level 0 stay False, so they're left out
+        free = [lit for lit in unique if vals[lit] == UNSET]
+        if not free:
+            self.unsat = True
+        elif len(free) == 1:
+            self.assign(free[0])
+        else:
+            c = self.cnf.append(free)
+            self.watches[free[0]].append(c)
+            self.watches[free[1]].append(c)
+            if learned:
+                self.learned[c] = len(free)
+
+    def push(self):
+        """
+        Opens a group of clauses, which lasts until the matching pop
+        """
+        cnf = self.cnf
+        # a tuple can't clash with the name of any variable of a formula
+        name = ('group', cnf.n)
+        self.activation.add(name)
+        self.groups.append(2*cnf.var(name))
+        self._grow()
+
+    def pop(self):
+        """
+        Removes every clause added since the matching push
+        """
+        lit = self.groups.pop()
+        self.backtrack()
+        if self.vals[lit ^ 1] == UNSET:
+            self.assign(lit ^ 1)
+
+    def solve(self, assumptions=(), budget=None):
+        """
+        Looks for a model of the clauses added so far in which every
+        (variable, boolean) literal of assumptions holds, within budget (see
+        Budget) if there is one.
+
+        Returns the model as a dictionary from variable names to booleans,
+        None if there's no such model, or UNKNOWN if the budget ran out
+        first. Everything learned until then is kept either way.
+        """
+        vals = self.search(self.groups + self._literals(assumptions), budget)
+        if vals is None or vals is UNKNOWN:
+            return vals
+        return {name: value for name, value in self.cnf.model(vals).items()
+                if name not in self.activation}
+
+    def reduce(self, budget=None):
+        """
+        Keeps the budget // 2 learned clauses with the lowest LBD (the newest
+        first among equal ones), where budget is clause_budget by default,
+        forgets the others, and compacts the clause storage. Has to be
+        called at level 0 once everything is propagated: clauses satisfied
+        at level 0 are dropped and literals that are False at level 0 are
+        left out, while the literals fixed at level 0 are kept as unit
+        clauses at the front.
+
+        This rewrites the CNF in place, original clauses included; with the
+        unit clauses, it stays equivalent to what it was.
+        """
+        if budget is None:
+            budget = self.clause_budget
+        cnf, vals, learned = self.cnf, self.vals, self.learned
+        lits, starts = cnf.lits, cnf.starts
+        keep = set(sorted(learned, key=lambda c: (learned[c], -c))[:int(budget) // 2])
+        new_lits = array('i')
+        new_starts = array('i', [0])
+        new_learned = {}
+        for lit in self.trail:
+            new_lits.append(lit)
+            new_starts.append(len(new_lits))
+            self.reason[lit >> 1] = None
+        for c in range(len(cnf)):
+            if c in learned and c not in keep:
+                continue
+            clause = lits[starts[c]:starts[c+1]]
+            if any(vals[lit] == TRUE for lit in clause):
+                continue
+            # everything is propagated, so at least two literals are left
+            new_lits.extend(lit for lit in clause if vals[lit] == UNSET)
+            new_starts.append(len(new_lits))
+            if c in learned:
+                new_learned[len(new_starts) - 2] = learned[c]
+        cnf.lits[:] = new_lits
+        cnf.starts[:] = new_starts
+        self.learned = new_learned
+        for watching in self.watches:
+            del watching[:]
+        for c in range(len(self.trail), len(cnf)):
+            self.watches[new_lits[new_starts[c]]].append(c)
+            self.watches[new_lits[new_starts[c] + 1]].append(c)
+
+    def search(self, assumptions=(), budget=None):
+        """
+        The search itself, with assumptions given as integer literals.
+
+        Returns the assignment bytearray (see CNF.model), None if there's no
+        model, or UNKNOWN if the budget ran out first.
+        """
+        if self.unsat:
+            return None
+        self.backtrack()
+        cnf = self.cnf
+        vals, level, reason = self.vals, self.level, self.reason
+        trail, levels, watches = self.trail, self.levels, self.watches
+        heuristic, assign = self.heuristic, self.assign
+        head = self.head
+        restarts, limit, exchange = self.restarts, self.clause_budget, self.exchange
+        # conflicts left until the next luby restart
+        until = self.restart_interval * luby(self.restart_count)
+        # LBD of the last GLUCOSE_WINDOW learned clauses (since the last
+        # restart), their sum, and the sum and count of all of them
+        recent = [0] * GLUCOSE_WINDOW
+        recent_sum = 0
+        since_restart = 0
+        total_lbd = 0
+        conflicts = 0
+        restart = False
+        stats = self.stats
+        progress = stats.progress
+        stats.peak_size = max(stats.peak_size, len(cnf.lits))
+        if budget is not None:
+            budget.start(stats)
+
+        while True:
+            before = len(trail)
+            head, conflict = propagate(cnf.lits, cnf.starts, watches, vals, trail, head, assign)
+            stats.propagations += len(trail) - before
+
+            if conflict is not None:
+                stats.conflicts += 1
+                if progress is not None and stats.conflicts % stats.progress_interval == 0:
+                    progress(stats)
+                if not levels:
+                    # conflict without any decision. No solutions, ever.
+                    self.unsat = True
+                    return None
+                clause, back = analyze(cnf, conflict, trail, level, reason, len(levels),
+                                       heuristic.bump)
+                heuristic.decay()
+                # undo every level above the one we jump back to
+                pos = levels[back]
+                for lit in trail[pos:]:
+                    vals[lit] = vals[lit ^ 1] = UNSET
+                    heuristic.unassign(lit)
+                del trail[pos:]
+                del levels[back:]
+                head = pos
+                stats.backtracks += 1
+                # the learned clause is unit now, so it forces its first literal
+                if len(clause) == 1:
+                    assign(clause[0])
+                    lbd = 1
+                else:
+                    lbd = len({level[lit >> 1] for lit in clause})
+                    c = cnf.append(clause)
+                    self.learned[c] = lbd
+                    if len(cnf.lits) > stats.peak_size:
+                        stats.peak_size = len(cnf.lits)
+                    watches[clause[0]].append(c)
+                    watches[clause[1]].append(c)
+                    assign(clause[0], c)
+                if exchange is not None:
+                    exchange.export(clause)
+
+                conflicts += 1
+                if restarts == 'luby':
+                    until -= 1
+                    restart = restart or until <= 0
+                elif restarts == 'glucose':
+                    total_lbd += lbd
+                    recent_sum += lbd - recent[since_restart % GLUCOSE_WINDOW]
+                    recent[since_restart % GLUCOSE_WINDOW] = lbd
+                    since_restart += 1
+                    restart = restart or (since_restart >= GLUCOSE_WINDOW and
+                                          recent_sum * GLUCOSE_MARGIN > total_lbd * GLUCOSE_WINDOW / conflicts)
+                continue
+
+            # restarts wait until everything is propagated, so that reduce
+            # can run at level 0
+            if restart or len(self.learned) > limit:
+                if restart:
+                    stats.restarts += 1
+                    self.restart_count += 1
+                    until = self.restart_interval * luby(self.restart_count)
+                    recent = [0] * GLUCOSE_WINDOW
+                    recent_sum = since_restart = 0
+                    restart = False
+                self.head = head
+                self.backtrack()
+                if len(self.learned) > limit:
+                    self.reduce(limit)
+                    limit = limit * CLAUSE_BUDGET_GROWTH + 1
+                head = len(trail)
+                if exchange is not None:
+                    for literals in exchange.collect():
+                        self.add_literals(literals, learned=True)
+                    if self.unsat:
+                        return None
+                continue
+
+            self.head = head
+            if budget is not None and budget.exhausted(stats):
+                return UNKNOWN
+            if len(levels) < len(assumptions):
+                # the next assumption gets a level of its own, even if it
+                # already holds, so levels and assumptions line up
+                lit = assumptions[len(levels)]
+                if vals[lit] == FALSE:
+                    return None
+                levels.append(len(trail))
+                if vals[lit] == UNSET:
+                    assign(lit)
+                continue
+
+            lit = heuristic.pick(vals)
+            if lit is None:
+                return vals
+            levels.append(len(trail))
+            assign(lit)
+            stats.decisions += 1
+            if len(levels) > stats.max_depth:
+                stats.max_depth = len(levels)
+
+def cdcl_search(cnf, heuristic=None, budget=None, prepare=None, **options):
+    """
+    Conflict-driven clause learning search of a Solver that's only used
+    once.
+
+    cnf: the formula (see CNF). The literals inside each clause get reordered
+        and learned clauses are appended to it (and forgotten again), and
+        Solver.reduce simplifies its clauses by what's fixed at level 0.
+    heuristic: branching heuristic (see IndexOrder), VSIDS by default.
+    budget: Budget that stops the search.
+    prepare: called with the Solver before it searches, to set it up
+        further (see portfolio.py).
+    options: restarts, restart_interval, clause_budget and stats of the
+        Solver.
+
+    Returns the assignment bytearray (see CNF.model), None if the formula
+    is unsatisfiable, or UNKNOWN if the budget ran out first.
+    """
+    if heuristic is None:
+        heuristic = 'vsids'
+    solver = Solver(cnf, heuristic, **options)
+    if prepare is not None:
+        prepare(solver)
+    return solver.search(budget=budget)
+
+def formula_kind(cnf):
+    """
+    Returns '2cnf' if no clause of the CNF has more than two literals,
+    'horn' if no clause has more than one positive literal, and None
+    otherwise. Both kinds can be solved in linear time (see two_sat and
+    horn_sat).
+    """
+    lits, starts = cnf.lits, cnf.starts
+    binary = horn = True
+    for c in range(len(cnf)):
+        if starts[c+1] - starts[c] > 2:
+            binary = False
+        if horn:
+            positive = 0
+            for k in range(starts[c], starts[c+1]):
+                positive += not lits[k] & 1
+            horn = positive <= 1
+        if not binary and not horn:
+            return None
+    return '2cnf' if binary else 'horn'
+
+def two_sat(cnf):
+    """
+    Solves a CNF where every clause has at most two literals in linear time.
+    Every clause (a or b) becomes the implications not a -> b and not b -> a,
+    and the formula is satisfiable exactly when no variable is in the same
+    strongly connected component as its negation. Components are found with
+    Tarjan's algorithm (without recursion), which finds them in reverse
+    topological order, so a literal is made True when its component was
+    found before its negation's.
+
+    Returns the assignment bytearray (see CNF.model), or None if the formula
+    is unsatisfiable.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    size = 2*cnf.n
+    # implication graph over literals
+    graph = [[] for _ in range(size)]
+    for c in range(len(cnf)):
+        clause = lits[starts[c]:starts[c+1]]
+        if not clause:
+            return None
+        a, b = clause[0], clause[-1]
+        graph[a ^ 1].append(b)
+        if a != b:
+            graph[b ^ 1].append(a)
+
+    # order in which literals were reached, lowest order reachable, and
+    # component of every literal
+    order = [-1] * size
+    low = [0] * size
+    component = [-1] * size
+    count = 0
+    components = 0
+    stack = []
+    for root in range(size):
+        if order[root] != -1:
+            continue
+        # literals being explored, with how many of their edges were followed
+        path = [(root, 0)]
+        order[root] = low[root] = count
+        count += 1
+        stack.append(root)
+        while path:
+            lit, edge = path[-1]
+            if edge < len(graph[lit]):
+                path[-1] = (lit, edge + 1)
+                nxt = graph[lit][edge]
+                if order[nxt] == -1:
+                    order[nxt] = low[nxt] = count
+                    count += 1
+                    stack.append(nxt)
+                    path.append((nxt, 0))
+                elif component[nxt] == -1:
+                    low[lit] = min(low[lit], order[nxt])
+                continue
+            path.pop()
+            if path:
+                parent = path[-1][0]
+                low[parent] = min(low[parent], low[lit])
+            if low[lit] == order[lit]:
+                # lit is the root of a component, which is the top of the stack
+                while True:
+                    top = stack.pop()
+                    component[top] = components
+                    if top == lit:
+                        break
+                components += 1
+
+    vals = bytearray([UNSET]) * size
+    for var in range(cnf.n):
+        pos, neg = component[2*var], component[2*var+1]
+        if pos == neg:
+            return None
+        vals[2*var], vals[2*var+1] = (TRUE, FALSE) if pos < neg else (FALSE, TRUE)
+    return vals
+
+def horn_sat(cnf):
+    """
+    Solves a CNF where every clause has at most one positive literal in
+    linear time. Starting with every variable False, the only way a clause
+    can be unsatisfied is when all the variables of its negative literals
+    are True, and then its positive literal has to be True as well. Every
+    clause keeps a count of its negative literals whose variable isn't True
+    yet, so each clause is looked at once per literal.
+
+    Returns the assignment bytearray (see CNF.model), or None if the formula
+    is unsatisfiable.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    n = cnf.n
+    # clauses in which every variable appears negated
+    negated = [[] for _ in range(n)]
+    # negative literals of every clause that aren't true yet, and its
+    # positive literal (or -1)
+    pending = [0] * len(cnf)
+    head = [-1] * len(cnf)
+    true = [False] * n
+    queue = []
+    for c in range(len(cnf)):
+        for k in range(starts[c], starts[c+1]):
+            lit = lits[k]
+            if lit & 1:
+                negated[lit >> 1].append(c)
+                pending[c] += 1
+            else:
+                head[c] = lit >> 1
+        if pending[c] == 0:
+            if head[c] == -1:
+                return None
+            queue.append(head[c])
+
+    while queue:
+        var = queue.pop()
+        if true[var]:
+            continue
+        true[var] = True
+        for c in negated[var]:
+            pending[c] -= 1
+            if pending[c] == 0:
+                if head[c] == -1:
+                    # every literal of the clause is false
+                    return None
+                queue.append(head[c])
+
+    vals = bytearray([UNSET]) * (2*n)
+    for var in range(n):
+        vals[2*var], vals[2*var+1] = (TRUE, FALSE) if true[var] else (FALSE, TRUE)
+    return vals
+
+class Preprocessor:
+    """
+    Simplifies a CNF before it is solved, with the usual preprocessing steps:
+        - duplicate clauses are only kept once
+        - unit clauses are fixed and propagated
+        - clauses that contain another clause are removed (subsumption)
+        - when clause C has a literal l and clause D has not l plus all the
+          other literals of C, not l is removed from D (self-subsuming
+          resolution)
+        - literals that lead to a conflict by unit propagation alone are
+          fixed to the other value (failed literal probing)
+        - a variable is eliminated by replacing the clauses it appears in
+          with all their resolvents on it, when that doesn't make the
+          formula bigger (bounded variable elimination)
+
+    The clauses removed by variable elimination are kept on a
+    reconstruction stack, so a model of the reduced formula can be extended
+    to the eliminated variables (see extend). report counts what every step
+    removed.
+
+    frozen variables are never eliminated, and occurrence_limit skips
+    variables that appear in more clauses than that.
+
+    >>> cnf = CNF.from_formula([[('a', True), ('b', True)], [('a', True), ('b', True)],
+    ...                         [('a', True), ('b', True), ('c', True)],
+    ...                         [('a', False), ('b', True)], [('b', False), ('c', True)]])
+    >>> reduced = Preprocessor(cnf)
+    >>> list(reduced.run().clauses())
+    [[('b', True)], [('c', True)]]
+    >>> reduced.report['clauses_removed'], reduced.report['variables_removed']
+    (3, 1)
+    """
+    def __init__(self, cnf, probe=True, eliminate=True, frozen=(), occurrence_limit=16):
+        self.cnf = cnf
+        self.probe = probe
+        self.eliminate = eliminate
+        self.frozen = set(frozen)
+        self.occurrence_limit = occurrence_limit
+        # clauses as sets of literals by id, and id of every clause
+        self.clauses = {}
+        self.ids = {}
+        self.next_id = 0
+        # clauses every literal appears in
+        self.occurs = [set() for _ in range(2*cnf.n)]
+        # literals fixed so far, and literals that still have to be fixed
+        self.fixed = bytearray([UNSET]) * (2*cnf.n)
+        self.units = []
+        # clauses added or changed since subsumption last looked at them
+        self.touched = set()
+        # (pivot literal, clause) for every clause removed by elimination
+        self.stack = []
+        self.unsat = False
+        self.report = {'duplicates': 0, 'subsumed': 0, 'strengthened': 0,
+                       'failed_literals': 0, 'eliminated': 0}
+
+    def add(self, literals):
+        """
+        Adds a clause, leaving out literals that are fixed to False
+        """
+        fixed = self.fixed
+        if any(fixed[lit] == TRUE for lit in literals):
+            return
+        clause = frozenset(lit for lit in literals if fixed[lit] != FALSE)
+        if clause in self.ids:
+            self.report['duplicates'] += 1
+        elif not clause:
+            self.unsat = True
+        elif len(clause) == 1:
+            self.units.extend(clause)
+        else:
+            c = self.next_id
+            self.next_id += 1
+            self.clauses[c] = clause
+            self.ids[clause] = c
+            for lit in clause:
+                self.occurs[lit].add(c)
+            self.touched.add(c)
+
+    def remove(self, c):
+        clause = self.clauses.pop(c)
+        del self.ids[clause]
+        for lit in clause:
+            self.occurs[lit].discard(c)
+        return clause
+
+    def fix_units(self):
+        """
+        Fixes every pending unit literal and simplifies the clauses with it
+        """
+        fixed = self.fixed
+        while self.units and not self.unsat:
+            lit = self.units.pop()
+            if fixed[lit] == FALSE:
+                self.unsat = True
+            if fixed[lit] != UNSET:
+                continue
+            fixed[lit] = TRUE
+            fixed[lit ^ 1] = FALSE
+            for c in list(self.occurs[lit]):
+                self.remove(c)
+            for c in list(self.occurs[lit ^ 1]):
+                self.add(self.remove(c))
+
+    def subsume(self):
+        """
+        Subsumption and self-subsuming resolution with every clause that was
+        added or changed since the last time
+        """
+        clauses, occurs = self.clauses, self.occurs
+        while self.touched and not self.unsat:
+            c = self.touched.pop()
+            if c not in clauses:
+                continue
+            clause = clauses[c]
+            # any clause C can act on has the literal of C that appears the
+            # least, or its negation
+            pivot = min(clause, key=lambda lit: len(occurs[lit]) + len(occurs[lit ^ 1]))
+            for d in list(occurs[pivot] | occurs[pivot ^ 1]):
+                if d == c or d not in clauses or len(clauses[d]) < len(clause):
+                    continue
+                other = clauses[d]
+                missing = clause - other
+                if not missing:
+                    self.remove(d)
+                    self.report['subsumed'] += 1
+                elif len(missing) == 1:
+                    lit = next(iter(missing))
+                    if lit ^ 1 in other:
+                        self.remove(d)
+                        self.add(other - {lit ^ 1})
+                        self.report['strengthened'] += 1
+            self.fix_units()
+
+    def probe_literals(self):
+        """
+        Failed literal probing: every literal that makes unit propagation
+        reach a conflict on its own is fixed to False
+        """
+        cnf = CNF()
+        cnf.names = self.cnf.names
+        for clause in self.clauses.values():
+            cnf.append(sorted(clause))
+        vals = bytearray([UNSET]) * (2*cnf.n)
+        trail = []
+
+        def assign(lit, reason=None):
+            vals[lit] = TRUE
+            vals[lit ^ 1] = FALSE
+            trail.append(lit)
+
+        def try_literal(lit):
+            # propagates lit on top of what is fixed, and undoes it all if
+            # that reaches a conflict
+            pos = len(trail)
+            assign(lit)
+            conflict = propagate(cnf.lits, cnf.starts, watches, vals, trail, pos, assign)[1]
+            if conflict is not None:
+                for undone in trail[pos:]:
+                    vals[undone] = vals[undone ^ 1] = UNSET
+                del trail[pos:]
+            return conflict is None
+
+        watches = watch_clauses(cnf, vals, assign)
+        for var in range(cnf.n):
+            for lit in (2*var, 2*var + 1):
+                if vals[lit] != UNSET or not self.occurs[lit ^ 1]:
+                    continue
+                pos = len(trail)
+                if try_literal(lit):
+                    # nothing failed, so only keep what was fixed before
+                    for undone in trail[pos:]:
+                        vals[undone] = vals[undone ^ 1] = UNSET
+                    del trail[pos:]
+                    continue
+                self.report['failed_literals'] += 1
+                if not try_literal(lit ^ 1):
+                    self.unsat = True
+                    return
+        self.units.extend(trail)
+        self.fix_units()
+        self.subsume()
+
+    def eliminate_variables(self):
+        """
+        Bounded variable elimination, trying the variables that appear the
+        least first
+        """
+        occurs = self.occurs
+        candidates = sorted((var for var in range(self.cnf.n) if var not in self.frozen),
+                            key=lambda v: len(occurs[2*v]) + len(occurs[2*v+1]))
+        for var in candidates:
+            if self.unsat:
+                return
+            pos, neg = occurs[2*var], occurs[2*var + 1]
+            total = len(pos) + len(neg)
+            if total == 0 or total > self.occurrence_limit:
+                continue
+            resolvents = []
+            for p in pos:
+                for q in neg:
+                    resolvent = (self.clauses[p] | self.clauses[q]) - {2*var, 2*var + 1}
+                    if not any(lit ^ 1 in resolvent for lit in resolvent):
+                        resolvents.append(resolvent)
+                if len(resolvents) > total:
+                    break
+            if len(resolvents) > total:
+                # eliminating var would make the formula bigger
+                continue
+            for lit in (2*var, 2*var + 1):
+                for c in list(occurs[lit]):
+                    self.stack.append((lit, self.remove(c)))
+            for resolvent in resolvents:
+                self.add(resolvent)
+            self.report['eliminated'] += 1
+            self.fix_units()
+            self.subsume()
+
+    def run(self):
+        """
+        Runs every step and returns the reduced formula as a CNF over the
+        same variables (fixed literals become unit clauses), or None if the
+        formula turned out to be unsatisfiable.
+        """
+        cnf = self.cnf
+        for i in range(len(cnf)):
+            self.add(cnf.clause(i))
+        self.fix_units()
+        self.subsume()
+        if self.probe and not self.unsat:
+            self.probe_literals()
+        if self.eliminate and not self.unsat:
+            self.eliminate_variables()
+        if self.unsat:
+            return None
+
+        reduced = CNF()
+        reduced.names = list(cnf.names)
+        reduced.ids = dict(cnf.ids)
+        for lit in range(2*cnf.n):
+            if self.fixed[lit] == TRUE:
+                reduced.append([lit])
+        for clause in self.clauses.values():
+            reduced.append(sorted(clause))
+
+        def used(formula):
+            return len({lit >> 1 for lit in formula.lits})
+        self.report['clauses_removed'] = len(cnf) - len(reduced)
+        self.report['variables_removed'] = used(cnf) - used(reduced)
+        return reduced
+
+    def extend(self, vals):
+        """
+        Extends the assignment bytearray of a model of the reduced formula
+        to a model of the original one, by going through the reconstruction
+        stack backwards and making the pivot literal of every clause that
+        isn't satisfied True.
+        """
+        for lit, clause in reversed(self.stack):
+            if not any(vals[other] == TRUE for other in clause):
+                vals[lit] = TRUE
+                vals[lit ^ 1] = FALSE
+        return vals
+
+def decompose(cnf):
+    """
+    Splits a CNF into independent parts. First, pure literals (literals
+    whose negation appears in no remaining clause) are made True and the
+    clauses they satisfy are dropped, until there are none left. Then the
+    variables of the remaining clauses are grouped with a union-find, so
+    that clauses sharing no variable, even indirectly, end up in different
+    components. Every component can be solved on its own, and the search
+    then costs the sum of the components instead of their product.
+
+    Returns the assignment bytearray with the pure literals set, together
+    with a list of (component, variables) pairs, where every component is a
+    CNF over its own dense variable indices and variables[v] is the variable
+    of the original CNF behind variable v of the component. Components come
+    from the smallest to the largest.
+    """
+    lits, starts = cnf.lits, cnf.starts
+    n = cnf.n
+    vals = bytearray([UNSET]) * (2*n)
+    # how many remaining clauses every literal appears in, and those clauses
+    count = [0] * (2*n)
+    occurs = [[] for _ in range(2*n)]
+    for c in range(len(cnf)):
+        for k in range(starts[c], starts[c+1]):
+            count[lits[k]] += 1
+            occurs[lits[k]].append(c)
+    removed = bytearray(len(cnf))
+    pure = [lit for lit in range(2*n) if count[lit] and not count[lit ^ 1]]
+    while pure:
+        lit = pure.pop()
+        if vals[lit] != UNSET:
+            continue
+        vals[lit] = TRUE
+        vals[lit ^ 1] = FALSE
+        for c in occurs[lit]:
+            if removed[c]:
+                continue
+            removed[c] = 1
+            for k in range(starts[c], starts[c+1]):
+                other = lits[k]
+                count[other] -= 1
+                # the negation of a literal that's gone may have become pure
+                if count[other] == 0 and count[other ^ 1] and vals[other] == UNSET:
+                    pure.append(other ^ 1)
+
+    # union-find over the variables of the remaining clauses
+    parent = list(range(n))
+    def find(var):
+        while parent[var] != var:
+            parent[var] = parent[parent[var]]
+            var = parent[var]
+        return var
+    for c in range(len(cnf)):
+        if not removed[c] and starts[c+1] > starts[c]:
+            root = find(lits[starts[c]] >> 1)
+            for k in range(starts[c] + 1, starts[c+1]):
+                other = find(lits[k] >> 1)
+                if other != root:
+                    parent[other] = root
+
+    parts = {}
+    for c in range(len(cnf)):
+        if removed[c]:
+            continue
+        if starts[c+1] == starts[c]:
+            # an empty clause can't be satisfied by any component
+            parts.setdefault(None, []).append(c)
+            continue
+        parts.setdefault(find(lits[starts[c]] >> 1), []).append(c)
+
+    components = []
+    for clauses in parts.values():
+        component = CNF()
+        variables = []
+        local = {}
+        for c in clauses:
+            literals = []
+            for k in range(starts[c], starts[c+1]):
+                var = lits[k] >> 1
+                if var not in local:
+                    local[var] = len(variables)
+                    variables.append(var)
+                    component.var(cnf.names[var])
+                literals.append(2*local[var] + (lits[k] & 1))
+            component.append(literals)
+        components.append((component, variables))
+    components.sort(key=lambda part: len(part[0].lits))
+    return vals, components
+
+def solve_cnf(cnf, mode='trail', heuristic=None, phase_saving=None, fast_paths=True,
+              stats=None, budget=None, **cdcl_options):
+    """
+    Solves a single CNF with the 'trail' or 'cdcl' search, or with two_sat
+    or horn_sat when fast_paths is on and the formula allows it (see
+    satisfying_assignment for the options).
+
+    Returns the assignment bytearray, None if the formula is
+    unsatisfiable, or UNKNOWN if the budget ran out first.
+    """
+    kind = formula_kind(cnf) if fast_paths else None
+    if kind == '2cnf':
+        return two_sat(cnf)
+    if kind == 'horn':
+        return horn_sat(cnf)
+    if heuristic is None:
+        heuristic = 'order' if mode == 'trail' else 'vsids'
+    if heuristic in HEURISTICS:
+        heuristic = HEURISTICS[heuristic]
+    options = {} if phase_saving is None else {'phase_saving': phase_saving}
+    if mode == 'trail':
+        return trail_search(cnf, heuristic(cnf, **options), stats, budget)
+    return cdcl_search(cnf, heuristic(cnf, **options), budget, stats=stats, **cdcl_options)
+
+def _digest(kind, lines):
+    return hashlib.sha256('\n'.join([kind] + lines).encode()).hexdigest()
+
+def formula_key(formula):
+    """
+    Hash of a formula (list of clauses of (variable, boolean) literals, CNF,
+    or parse_formula's dictionary) as a hex string, which doesn't change with
+    the order of the clauses or of the literals in them, or with repeated
+    ones, so that the same formula always has the same key.
+
+    >>> shuffled = [[('c', True)], [('b', False), ('a', True), ('a', True)]]
+    >>> formula_key([[('a', True), ('b', False)], [('c', True)]]) == formula_key(shuffled)
+    True
+    >>> formula_key([[('a', True)]]) == formula_key([[('a', False)]])
+    False
+    """
+    if isinstance(formula, dict):
+        formula = (clause.items() for clause in formula.values())
+    elif isinstance(formula, CNF):
+        formula = formula.clauses()
+    clauses = {'\t'.join(sorted({repr((name, bool(val))) for name, val in clause}))
+               for clause in formula}
+    return _digest('formula', sorted(clauses))
+
+def scheduling_key(student_preferences, room_capacities, extra_clauses=None, **options):
+    """
+    Hash of a scheduling problem (see solve_scheduling_problem), like
+    formula_key: the order of the students, of the rooms and of the rooms
+    every student lists doesn't matter.
+    """
+    lines = sorted(repr((student, sorted(set(rooms), key=repr)))
+                   for student, rooms in student_preferences.items())
+    lines += sorted(repr(room) for room in room_capacities.items())
+    lines.append(formula_key(extra_clauses or []))
+    lines.append(repr(sorted(options.items())))
+    return _digest('scheduling', lines)
+
+# what ResultCache.get returns for keys it doesn't have, as None is a result
+_MISSING = object()
+
+class ResultCache:
+    """
+    Results of solves by key (see formula_key and scheduling_key), so that
+    solving the same problem again takes a lookup instead of a search.
+
+    Results are kept pickled, both to know how many bytes they take and so
+    that every hit gets its own copy to change. The most recently used ones
+    are kept in memory, up to max_bytes in all. With a directory, every
+    result is also written there, one file per key, and read back when it's
+    not in memory anymore, so that it outlives the process. The directory
+    is kept under max_disk_bytes by removing the files written or read the
+    longest ago.
+
+    The keys only depend on the problem, so a directory must not outlive a
+    change to the solver that gives different results.
+
+    >>> cache = ResultCache()
+    >>> formula = [[('a', True)], [('a', False), ('b', True)]]
+    >>> satisfying_assignment(formula, cache=cache)
+    {'a': True, 'b': True}
+    >>> satisfying_assignment(formula[::-1], cache=cache)
+    {'a': True, 'b': True}
+    >>> (cache.hits, cache.misses)
+    (1, 1)
+    """
+    def __init__(self, max_bytes=64 * 2**20, directory=None, max_disk_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.disk_size = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(stat.st_size for path, stat in self._files())
+
+    def _files(self):
+        # (path, os.stat_result) of the results in the directory, without
+        # the files still being written. Other processes can share the
+        # directory, so any file may be gone by the time it's looked at.
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return files
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_file():
+                    files.append((entry.path, entry.stat()))
+            except OSError:
+                pass
+        return files
+
+    def _prune(self):
+        # removes the files used the longest ago, down to three quarters of
+        # max_disk_bytes so that this doesn't happen on every put
+        files = sorted(self._files(), key=lambda file: file[1].st_mtime)
+        self.disk_size = sum(stat.st_size for path, stat in files)
+        for path, stat in files:
+            if self.disk_size <= self.max_disk_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_size -= stat.st_size
+
+    def _remember(self, key, data):
+        # keeps data in memory as the most recently used entry
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            if len(data) > self.max_bytes:
+                return
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self.size -= len(self.entries.popitem(last=False)[1])
+
+    def get(self, key, default=None):
+        """
+        Result stored under key, or default if there is none
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+        if data is None and self.directory is not None:
+            path = os.path.join(self.directory, key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # used now, as far as _prune is concerned
+                os.utime(path)
+            except OSError:
+                pass
+            if data is not None:
+                self._remember(key, data)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if data is None:
+            return default
+        return pickle.loads(data)
+
+    def put(self, key, result):
+        """
+        Stores result under key
+        """
+        data = pickle.dumps(result)
+        self._remember(key, data)
+        if self.directory is not None:
+            # written elsewhere and renamed, so that nobody reads half a file;
+            # if the directory is gone, the result only stays in memory
+            try:
+                fd, path = tempfile.mkstemp(dir=self.directory, prefix='.')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(path, os.path.join(self.directory, key))
+            except OSError:
+                return
+            with self.lock:
+                self.disk_size += len(data)
+                if self.disk_size > self.max_disk_bytes:
+                    self._prune()
+
+    def clear(self):
+        """
+        Forgets what's in memory (but not what's in the directory)
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+def satisfying_assignment(formula, mode='trail', heuristic=None, phase_saving=None,
+                          fast_paths=True, preprocessing=False, decomposition=True,
+                          stats=None, budget=None, cache=None, **cdcl_options):
     """
     Find a satisfying assignment for a given CNF formula.
-    Returns that assignment if one exists, or None otherwise.
+    Returns that assignment if one exists, or None otherwise (or UNKNOWN,
+    see budget below).
+
+    The formula is either a list of clauses of (variable, boolean) literals
+    or a CNF, which the 'trail' and 'cdcl' modes may reorder or add to, and
+    the 'cdcl' mode may also rewrite (see Solver.reduce: clauses satisfied
+    by the literals fixed at level 0 are removed and the False ones left
+    out of the others, with the fixed literals added as unit clauses, so
+    that it stays an equivalent formula), or any other iterable of clauses
+    (scheduling_clauses, for one), which is read one clause at a time.
+
+    mode selects how the search keeps track of the formula:
+        'trail' (default): one formula is kept together with a trail of
+            assignments, backtracking only undoes what changed and unit
+            propagation uses two watched literals (see trail_search)
+        'cdcl': conflict-driven clause learning with first-UIP analysis and
+            non-chronological backjumping (see cdcl_search)
+        'copy': every decision works on a simplified copy of the formula
+
+    heuristic picks the branching heuristic of the 'trail' and 'cdcl' modes,
+    either by name from HEURISTICS ('order', 'jw', 'moms' or 'vsids') or as a
+    class built like IndexOrder. By default, 'trail' decides in index order
+    and 'cdcl' uses VSIDS. phase_saving turns phase saving on or off, leaving
+    the heuristic's own default when None.
+
+    With fast_paths, the 'trail' and 'cdcl' modes first check whether the
+    formula is 2-CNF or Horn (see formula_kind) and then solve it in linear
+    time with two_sat or horn_sat instead of searching.
+
+    With preprocessing, the 'trail' and 'cdcl' modes simplify the formula
+    with a Preprocessor before anything else.
+
+    With decomposition, the 'trail' and 'cdcl' modes drop pure literals and
+    solve every connected component of the formula on its own (see
+    decompose), merging their models.
+
+    stats, if given, is a Stats that counts what the search does and how
+    long every phase takes ('parse', 'preprocess', 'decompose', 'search' and
+    'extend', or 'parse', 'copy', 'simplify' and 'unit_scan' in 'copy'
+    mode), and that can report progress along the way.
+
+    budget, if given, is a Budget that limits the search (time, conflicts,
+    decisions or size) and can be cancelled from another thread. When it
+    runs out, the result is UNKNOWN instead of a model or None.
+
+    cache, if given, is a ResultCache that answers formulas it has seen
+    before, in any clause and literal order (see formula_key), without
+    solving them again; stats then doesn't count anything. UNKNOWN results
+    aren't kept.
+
+    Any other keyword argument (restarts, restart_interval, clause_budget,
+    prepare) configures the Solver of the 'cdcl' mode (see cdcl_search),
+    one for every component.
 
     >>> satisfying_assignment([])
     {}
@@ -161,9 +2114,101 @@ def satisfying_assignment(formula):
     >>> x.get('a', None) is True or x.get('b', None) is False or x.get('c', None) is True
     True
     >>> satisfying_assignment([[('a', True)], [('a', False)]])
+    >>> satisfying_assignment([[('a', True)], [('a', False)]], mode='copy')
+    >>> satisfying_assignment([[('a', True)], [('a', False)]], mode='cdcl')
+    >>> satisfying_assignment([[('a', True)], [('a', False)]], heuristic='moms')
     """
+    if cache is not None:
+        if not isinstance(formula, (list, dict, CNF)):
+            # formula_key would use the clauses up
+            formula = CNF.from_formula(formula)
+        key = formula_key(formula)
+        assignment = cache.get(key, _MISSING)
+        if assignment is _MISSING:
+            assignment = satisfying_assignment(formula, mode, heuristic, phase_saving, fast_paths,
+                                               preprocessing, decomposition, stats, budget,
+                                               **cdcl_options)
+            if assignment is not UNKNOWN:
+                cache.put(key, assignment)
+        return assignment
+    # the 'copy' mode only times its phases and measures its formulas when
+    # someone asked for them
+    measured = stats is not None
+    if stats is None:
+        stats = Stats()
+    if budget is not None:
+        budget.start(stats)
+    start = time.perf_counter()
+    if mode in ('trail', 'cdcl'):
+        cnf = formula if isinstance(formula, CNF) else CNF.from_formula(formula)
+        start = stats.lap('parse', start)
+        preprocessor = Preprocessor(cnf) if preprocessing else None
+        if preprocessor is not None:
+            cnf = preprocessor.run()
+            start = stats.lap('preprocess', start)
+            if cnf is None:
+                return None
+        options = {'mode': mode, 'heuristic': heuristic, 'phase_saving': phase_saving,
+                   'fast_paths': fast_paths, 'stats': stats, 'budget': budget}
+        options.update(cdcl_options)
+        if decomposition:
+            vals, components = decompose(cnf)
+            start = stats.lap('decompose', start)
+            for component, variables in components:
+                part = solve_cnf(component, **options)
+                start = stats.lap('search', start)
+                if part is None or part is UNKNOWN:
+                    return part
+                for v, var in enumerate(variables):
+                    vals[2*var], vals[2*var+1] = part[2*v], part[2*v+1]
+            # variables left out of every clause can be anything
+            for var in range(cnf.n):
+                if vals[2*var] == UNSET:
+                    vals[2*var], vals[2*var+1] = FALSE, TRUE
+        else:
+            vals = solve_cnf(cnf, **options)
+            start = stats.lap('search', start)
+        if vals is None or vals is UNKNOWN:
+            return vals
+        if preprocessor is not None:
+            preprocessor.extend(vals)
+        model = cnf.model(vals)
+        stats.lap('extend', start)
+        return model
+    if mode != 'copy':
+        raise ValueError("unknown solver mode: %s" % mode)
+    if isinstance(formula, CNF):
+        formula = list(formula.clauses())
+    elif not isinstance(formula, (list, dict)):
+        formula = list(formula)
+
     # get new formula representation and other dictionaries
     formula, assignment, state, indices, variables = parse_formula(formula)
+    start = stats.lap('parse', start)
+    if any(not clause for clause in formula.values()):
+        return None
+    # copying and simplifying are timed on their own
+    def timed(phase, function):
+        def wrapper(*args):
+            begin = time.perf_counter()
+            result = function(*args)
+            stats.lap(phase, begin)
+            return result
+        return wrapper
+    if measured:
+        copy, simplify = timed('copy', get_copy), timed('simplify', simplify_formula)
+    else:
+        copy, simplify = get_copy, simplify_formula
+    # number of literals of every formula we keep, and of all of them, for
+    # stats.peak_size (only when it's asked for or limited)
+    sizing = measured or (budget is not None and budget.max_size is not None)
+    def size(formula):
+        return sum(len(clause) for clause in formula.values())
+    if sizing:
+        sizes = {0: size(formula)}
+        total = sizes[0]
+        stats.peak_size = max(stats.peak_size, total)
+    progress = stats.progress
     # dictionary that will keep track of all formulas generated, in case
     # we need to backtrack to a previous formula
     formulas = {0:formula}
@@ -174,14 +2219,20 @@ def satisfying_assignment(formula):
     
     # while all variables have not been assigned yet...
     while assigned != len(assignment):
+        if budget is not None and budget.exhausted(stats):
+            return UNKNOWN
         # find unit clauses and propogate their effects
         # unit_cs => unit clauses. Keeps track of how many we've found
         unit_cs = 0
         # n_formula => new formula. Make copy of the current formula
-        n_formula = get_copy(c_formula)
+        n_formula = copy(c_formula)
         # keep track of whether we reached a contradiction when assigning
         # unit clauses and we need to backtrack
         deadend = False
+        # the unit clause scan is timed without the simplifying it does
+        if measured:
+            scan_start = time.perf_counter()
+            simplified = stats.times.get('simplify', 0.0)
         # while there are still unit clauses to assign...
         while True:
             # for every clause...
@@ -203,7 +2254,7 @@ def satisfying_assignment(formula):
                     # update the variables state
                     state[assigned] = 1
                     # now that we have assigned a value to the variable, simplify the current formula
-                    n_formula = simplify_formula(n_formula, variables[assigned], clause[variables[assigned]])
+                    n_formula = simplify(n_formula, variables[assigned], clause[variables[assigned]])
                     # if a contradiction was not reached...
                     if n_formula != None:
                         # make the current formula the new one we just got by simplifying
@@ -214,10 +2265,14 @@ def satisfying_assignment(formula):
                         assigned += 1
                         # save the formula we just found
                         formulas[assigned] = n_formula
+                        stats.propagations += 1
                     else:
                         # if a contradiction was reached, then the current assignment does not work,
                         # so make deadend True
                         deadend = True
+                        stats.conflicts += 1
+                        if progress is not None and stats.conflicts % stats.progress_interval == 0:
+                            progress(stats)
                     # get out of the for loop
                     break
             # if no unit clauses are in the current formula, then get out of the while loop
@@ -229,6 +2284,7 @@ def satisfying_assignment(formula):
                     # can't backtrack further. No solutions.
                     return None
                 else:
+                    stats.backtracks += 1
                     # backtrack. Reset all values of the current variable we tried assignning
                     # something to
                     state[assigned] = 0
@@ -237,8 +2293,11 @@ def satisfying_assignment(formula):
                     # from assigned to backtrack
                     assigned -= unit_cs 
                     # go back to the formula that does not end in a contradiction
-                    c_formula = get_copy( formulas[assigned])
+                    c_formula = copy( formulas[assigned])
                     break
+        if measured:
+            stats.add_time('unit_scan', time.perf_counter() - scan_start
+                           - (stats.times.get('simplify', 0.0) - simplified))
         # if all variables managed to be assigned by unit clauses, then stop assigning
         if assigned == len(assignment): 
             break
@@ -249,7 +2308,7 @@ def satisfying_assignment(formula):
             # that has not been tried.
             if state[assigned] != 2 and assignment[assigned] != setting:
                 # get new formula
-                n_formula = simplify_formula(c_formula, variables[assigned], setting)
+                n_formula = simplify(c_formula, variables[assigned], setting)
                 # if formula works...
                 if n_formula != None:
                     # assign the current variable to the chosen setting
@@ -260,12 +2319,16 @@ def satisfying_assignment(formula):
                     assigned += 1
                     # make the current formula the new one we found
                     c_formula = n_formula
+                    stats.decisions += 1
                     # go to next variable
                     break
                 # if the chosen setting led to a contradiction, then try
                 # the other setting, but update the variables state
                 else:
                     state[assigned] += 1
+                    stats.conflicts += 1
+                    if progress is not None and stats.conflicts % stats.progress_interval == 0:
+                        progress(stats)
         # if nothing worked, then backtrack
         else:
             if assigned == 0:
@@ -276,13 +2339,188 @@ def satisfying_assignment(formula):
                 state[assigned] = 0
                 assignment[assigned] = None
                 assigned -= 1
-                c_formula = get_copy( formulas[assigned])
+                c_formula = copy( formulas[assigned])
+                stats.backtracks += 1
         # save previous formula
         formulas[assigned] = c_formula
+        stats.max_depth = max(stats.max_depth, assigned)
+        if sizing:
+            total -= sizes.get(assigned, 0)
+            sizes[assigned] = size(c_formula)
+            total += sizes[assigned]
+            stats.peak_size = max(stats.peak_size, total)
 
     # return dictionary with assignments
     return {variables[k]:v for k,v in assignment.items()}
 
+def all_satisfying_assignments(formula, variables=None):
+    """
+    Generator over every satisfying assignment of a formula (a list of
+    clauses of (variable, boolean) literals, a CNF, or the dictionary of
+    clause dictionaries that parse_formula makes), one at a time, as
+    dictionaries like the ones satisfying_assignment returns.
+
+    A single Solver finds them all: after every model, a blocking clause
+    that rules it out is added and the search goes on, keeping everything
+    learned so far. The blocking clause only needs the negation of the
+    decisions that led to the model, since unit propagation forced the rest.
+
+    With variables, only the assignments of those variables are enumerated:
+    models that agree on them come up once. Scheduling formulas with
+    auxiliary variables (see is_auxiliary) need this, or the same schedule
+    comes up once for every assignment of the auxiliary variables.
+
+    >>> sorted(sorted(m.items()) for m in all_satisfying_assignments([[('a', True), ('b', True)]]))
+    [[('a', False), ('b', True)], [('a', True), ('b', False)], [('a', True), ('b', True)]]
+    """
+    cnf = formula if isinstance(formula, CNF) else CNF.from_formula(formula)
+    solver = Solver(cnf)
+    if variables is not None:
+        projection = [cnf.var(name) for name in variables]
+        solver._grow()
+    while True:
+        vals = solver.search()
+        if vals is None:
+            return
+        model = cnf.model(vals)
+        if variables is None:
+            blocking = [solver.trail[pos] ^ 1 for pos in solver.levels]
+        else:
+            blocking = [2*var + (vals[2*var] == TRUE) for var in projection]
+            model = {name: model[name] for name in variables}
+        yield model
+        # with no decisions, this model was the only one left
+        solver.backtrack()
+        solver.add_literals(blocking)
+
+def count_models(formula):
+    """
+    Exact number of satisfying assignments of a formula (same kinds as
+    all_satisfying_assignments) over the variables that appear in it
+    (#SAT), without going through the models one by one. As with
+    all_satisfying_assignments, auxiliary variables are counted too.
+
+    This is a DPLL search that counts instead of stopping: after every
+    decision and the unit propagation that follows it, the clauses that are
+    left are split into connected components (see decompose), the count of
+    the formula is the product of the counts of its components, and every
+    component is only counted once however many times it comes up (a cache
+    keyed on its set of clauses). Variables that disappear from every
+    clause without being assigned double the count.
+
+    >>> count_models([[('a', True), ('b', True)], [('c', True), ('d', False)]])
+    9
+    """
+    cnf = formula if isinstance(formula, CNF) else CNF.from_formula(formula)
+    clauses = frozenset(frozenset(cnf.clause(i)) for i in range(len(cnf)))
+    if frozenset() in clauses:
+        return 0
+    used = {lit >> 1 for clause in clauses for lit in clause}
+    count = _run_nested(_count_clauses(clauses, {}))
+    # variables of clauses that were always satisfied can be anything
+    return count * 2 ** (cnf.n - len(used))
+
+def _run_nested(generator):
+    """
+    Runs a generator that yields the generators of its subproblems instead
+    of calling itself, and gets their results sent back, and returns its own
+    result. The nesting is kept on a list rather than the call stack, so
+    that it can go as deep as it needs (every variable of count_models can
+    take two levels) without ever touching the recursion limit.
+    """
+    stack = [generator]
+    value = None
+    while True:
+        try:
+            child = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            if not stack:
+                return value
+        else:
+            stack.append(child)
+            value = None
+
+def _count_clauses(clauses, cache):
+    """
+    Number of assignments of the variables of clauses (a frozenset of
+    frozensets of literals, none of them empty) that satisfy them all, as
+    a generator for _run_nested
+    """
+    # union-find over the variables, to split clauses into components
+    parent = {}
+    def find(var):
+        while parent.setdefault(var, var) != var:
+            parent[var] = parent[parent[var]]
+            var = parent[var]
+        return var
+    for clause in clauses:
+        lits = iter(clause)
+        root = find(next(lits) >> 1)
+        for lit in lits:
+            other = find(lit >> 1)
+            if other != root:
+                parent[other] = root
+    components = {}
+    for clause in clauses:
+        components.setdefault(find(next(iter(clause)) >> 1), []).append(clause)
+
+    total = 1
+    for component in components.values():
+        component = frozenset(component)
+        if component not in cache:
+            cache[component] = yield _count_component(component, cache)
+        total *= cache[component]
+        if not total:
+            return 0
+    return total
+
+def _count_component(clauses, cache):
+    """
+    Same as _count_clauses, for clauses that make up one component
+    """
+    occurrences = {}
+    for clause in clauses:
+        for lit in clause:
+            occurrences[lit >> 1] = occurrences.get(lit >> 1, 0) + 1
+    # branch on the variable in the most clauses
+    var = max(occurrences, key=occurrences.get)
+    total = 0
+    for lit in (2*var, 2*var + 1):
+        # unit propagation from lit
+        true = {lit}
+        units = [lit]
+        rest = clauses
+        while units:
+            units = []
+            simplified = set()
+            for clause in rest:
+                if any(other in true for other in clause):
+                    continue
+                clause = frozenset(other for other in clause if other ^ 1 not in true)
+                if not clause:
+                    break
+                if len(clause) == 1:
+                    units.extend(clause)
+                simplified.add(clause)
+            else:
+                # a literal and its negation both forced is a conflict too
+                if any(unit ^ 1 in units for unit in units):
+                    break
+                true.update(units)
+                rest = simplified
+                continue
+            break
+        else:
+            left = {other >> 1 for clause in rest for other in clause}
+            free = len(occurrences) - len(true) - len(left)
+            if rest:
+                total += (yield _count_clauses(frozenset(rest), cache)) * 2 ** free
+            else:
+                total += 2 ** free
+    return total
+
 def combinations(iterable, r):
     """
     Given an iterable and r that's the size of the combinations wanted,
@@ -308,6 +2546,123 @@ def combinations(iterable, r):
             indices[j] = indices[j-1] + 1
         yield tuple(pool[i] for i in indices)
 
+def count_combinations(n, r):
+    """
+    Number of combinations of size r out of n items, without generating them
+    """
+    if r > n:
+        return 0
+    count = 1
+    for i in range(min(r, n - r)):
+        count = count * (n - i) // (i + 1)
+    return count
+
+def at_most_naive(variables, k, name):
+    """
+    Says that at most k of the given variables are True by saying that in
+    every group of k+1 of them, at least one is False. That's one clause for
+    every group, so C(len(variables), k+1) clauses.
+    """
+    for group in combinations(variables, k+1):
+        yield [(var, False) for var in group]
+
+def at_most_sequential(variables, k, name):
+    """
+    Says that at most k of the given variables are True with a sequential
+    counter (Sinz, 2005). For the first i variables, the auxiliary variable
+    name_i_j is True whenever at least j of them are True, so the counter can
+    be carried from one variable to the next and no variable is allowed to
+    push it past k. That's O(len(variables) * k) clauses and auxiliary
+    variables.
+
+    Auxiliary variables are named "atmost_<name>_<i>_<j>", so they always
+    have more than one underscore (see is_auxiliary). Callers keep name
+    unique across the whole formula.
+    """
+    n = len(variables)
+    if k >= n:
+        return
+    if k == 0:
+        for var in variables:
+            yield [(var, False)]
+        return
+    def s(i, j):
+        return "atmost_%s_%s_%s" % (name, i, j)
+
+    # the first variable starts the count
+    yield [(variables[0], False), (s(0, 1), True)]
+    for j in range(2, k+1):
+        yield [(s(0, j), False)]
+    for i in range(1, n-1):
+        x = variables[i]
+        yield [(x, False), (s(i, 1), True)]
+        yield [(s(i-1, 1), False), (s(i, 1), True)]
+        for j in range(2, k+1):
+            # the count goes up by one if x is True...
+            yield [(x, False), (s(i-1, j-1), False), (s(i, j), True)]
+            # ...and never goes down
+            yield [(s(i-1, j), False), (s(i, j), True)]
+        # x can't be True once k variables before it are
+        yield [(x, False), (s(i-1, k), False)]
+    yield [(variables[n-1], False), (s(n-2, k), False)]
+
+def at_most_one_product(variables, name):
+    """
+    Says that at most one of the given variables is True with the product
+    encoding (Chen, 2010). The variables are laid out on a grid of about
+    sqrt(n) by sqrt(n), with an auxiliary variable for every row and every
+    column, and each variable being True forces its row and its column to be
+    True. Two True variables would then need two rows or two columns, and at
+    most one row and one column are allowed by encoding the rows and the
+    columns the same way, recursively. That's 2n + O(sqrt(n)) clauses.
+
+    Auxiliary variables are named "product_<name>_row_<r>" and
+    "product_<name>_col_<c>".
+    """
+    n = len(variables)
+    if n <= 4:
+        # pairwise is smaller than the grid for only a few variables
+        yield from at_most_naive(variables, 1, name)
+        return
+    columns = 1
+    while columns * columns < n:
+        columns += 1
+    rows = (n + columns - 1) // columns
+    row_vars = ["product_%s_row_%s" % (name, r) for r in range(rows)]
+    col_vars = ["product_%s_col_%s" % (name, c) for c in range(columns)]
+    for i, var in enumerate(variables):
+        yield [(var, False), (row_vars[i // columns], True)]
+        yield [(var, False), (col_vars[i % columns], True)]
+    yield from at_most_one_product(row_vars, name + "_row")
+    yield from at_most_one_product(col_vars, name + "_col")
+
+# ways of saying "at most k of these variables are True"
+CARDINALITY_ENCODINGS = {
+    'naive': at_most_naive,
+    'sequential': at_most_sequential,
+}
+
+# ways of saying "at most one of these variables is True"
+AT_MOST_ONE_ENCODINGS = {
+    'pairwise': lambda variables, name: at_most_naive(variables, 1, name),
+    'sequential': lambda variables, name: at_most_sequential(variables, 1, name),
+    'product': at_most_one_product,
+}
+
+# above this many clauses for a room, the naive encoding isn't used by default
+NAIVE_CLAUSE_LIMIT = 10000
+
+# above this many rooms for a student, the pairwise encoding isn't used by default
+PAIRWISE_ROOM_LIMIT = 10
+
+def is_auxiliary(var):
+    """
+    Whether a variable of a scheduling formula is an auxiliary variable
+    rather than one of the student_room variables. Student and room names
+    have no underscores, so only auxiliary variables have more than one.
+    """
+    return var.count('_') != 1
+
 def students_in_desired_sessions(student_preferences):
     """
     First rule for scheduling problem: make sure that each student
@@ -315,17 +2670,14 @@ def students_in_desired_sessions(student_preferences):
 
     That can simply be represented as a clause where each room is set to True.
 
-    Returns cnf representation of rule
+    Yields the clauses of the rule
     """
-    # list that will keep track of all conditions for room pref's.
-    output = []
     # for every student and their preferences...
     for student, rooms in student_preferences.items():
-        output.append( [(student + "_" + room, True) for room in rooms] )
-
-    return output
+        yield [(student + "_" + room, True) for room in rooms]
 
-def assign_to_one_room_only(student_preferences, room_capacities):
+def assign_to_one_room_only(student_preferences, room_capacities, encoding=None,
+                            only_listed=False):
     """
     Second rule for scheduling problem: make sure that each student
     is assigned to one room only.
@@ -334,18 +2686,28 @@ def assign_to_one_room_only(student_preferences, room_capacities):
     a student can only be in one of them, (i.e. only one variable can be True).
     That's the same as setting both of them to False.
 
-    Returns cnf representation of rule
-    """
-    pairs = [combo for combo in combinations(room_capacities.keys(), 2)]
+    That's a clause for every pair of rooms, so encoding picks another way of saying
+    "at most one" from AT_MOST_ONE_ENCODINGS. By default, students with more than
+    PAIRWISE_ROOM_LIMIT rooms to choose from use the product encoding instead.
+
+    With only_listed, a student is only constrained over the rooms they listed, since
+    the variables of the other rooms then appear nowhere in the formula.
 
-    # list that will keep track of all conditions
-    output = []
-    for student in student_preferences.keys():
-        for pair in pairs:
-            output.append( [(student+"_"+pair[0], False), (student+"_"+pair[1], False)] )
-    return output
+    Yields the clauses of the rule
+    """
+    for student, listed in student_preferences.items():
+        rooms = listed if only_listed else room_capacities.keys()
+        # rooms without repeats, in order
+        rooms = list(dict.fromkeys(rooms))
+        student_encoding = encoding
+        if student_encoding is None:
+            pairwise = len(rooms) <= PAIRWISE_ROOM_LIMIT
+            student_encoding = 'pairwise' if pairwise else 'product'
+        at_most_one = AT_MOST_ONE_ENCODINGS[student_encoding]
+        yield from at_most_one([student+"_"+room for room in rooms], "student_" + student)
 
-def no_oversubscribed_session(student_preferences, room_capacities):
+def no_oversubscribed_session(student_preferences, room_capacities, encoding=None,
+                              only_listed=False):
     """
     Third rule for scheduling problem: make sure that no room is overbooked.
 
@@ -354,25 +2716,50 @@ def no_oversubscribed_session(student_preferences, room_capacities):
     That implies that all students being there cannot be true, which is the same as setting
     all of them to False by Demorgan's Law. 
 
-    Returns cnf representation of rule.
+    That's one clause for every group of N+1 students, which quickly becomes far too
+    many, so encoding picks another way of saying "at most N" from CARDINALITY_ENCODINGS.
+    By default, rooms that would need more than NAIVE_CLAUSE_LIMIT clauses use a
+    sequential counter with auxiliary variables instead.
+
+    With only_listed, only the students who listed a room count towards its capacity
+    (see assign_to_one_room_only).
+
+    Yields the clauses of the rule.
     """
-    output = []
-    # get all students
-    students = list(student_preferences.keys())
     # for every room and its capacity...
     for room, cap in room_capacities.items():
-        # get all possible groups of students that include one more student
-        # than the capacity of the room. So if room can N students, group size
-        # is N+1 
-        groups = [combo for combo in combinations(students, cap+1)]
-        # for every possible group of the room...
-        for group in groups:
-            # add the clause to the output, where each variable is set to False
-            output.append([(student+"_"+room, False) for student in group])
+        # get the students that could end up in the room
+        students = [student for student, listed in student_preferences.items()
+                    if not only_listed or room in listed]
+        room_encoding = encoding
+        if room_encoding is None:
+            naive = count_combinations(len(students), cap+1) <= NAIVE_CLAUSE_LIMIT
+            room_encoding = 'naive' if naive else 'sequential'
+        at_most = CARDINALITY_ENCODINGS[room_encoding]
+        # at most cap of the students can be in the room
+        yield from at_most([student+"_"+room for student in students], cap, "room_" + room)
 
-    return output            
+def scheduling_clauses(student_preferences, room_capacities, capacity_encoding=None,
+                       one_room_encoding=None, only_listed=False):
+    """
+    Yields the clauses of boolify_scheduling_problem (with the same
+    arguments) one at a time, without ever holding the whole formula as
+    lists, so that they can go straight into a CNF (or a Solver, which
+    builds one from them) or into dimacs.write_dimacs. That only saves
+    memory: solving starts once the last clause is in.
+
+    >>> cnf = CNF.from_formula(scheduling_clauses({'Alice': ['basement']}, {'basement': 1}))
+    >>> satisfying_assignment(cnf)
+    {'Alice_basement': True}
+    """
+    yield from students_in_desired_sessions(student_preferences)
+    yield from assign_to_one_room_only(student_preferences, room_capacities,
+                                       one_room_encoding, only_listed)
+    yield from no_oversubscribed_session(student_preferences, room_capacities,
+                                         capacity_encoding, only_listed)
 
-def boolify_scheduling_problem(student_preferences, room_capacities):
+def boolify_scheduling_problem(student_preferences, room_capacities, capacity_encoding=None,
+                               one_room_encoding=None, only_listed=False):
     """
     Convert a quiz room scheduling problem into a Boolean formula.
 
@@ -385,13 +2772,161 @@ def boolify_scheduling_problem(student_preferences, room_capacities):
     Returns: a CNF formula encoding the scheduling problem, as per the
              lab write-up
 
+    capacity_encoding: how room capacities are encoded (see no_oversubscribed_session)
+
+    one_room_encoding: how "at most one room per student" is encoded, and only_listed
+                       whether that only covers the rooms each student listed (see
+                       assign_to_one_room_only)
+
     We assume no student or room names contain underscores.
+
+    scheduling_clauses gives the same clauses without building the list.
+    """
+    return list(scheduling_clauses(student_preferences, room_capacities, capacity_encoding,
+                                   one_room_encoding, only_listed))
+
+def schedule_by_matching(student_preferences, room_capacities):
+    """
+    Solves a scheduling problem with no extra constraints as a bipartite
+    matching where every room can take as many students as its capacity,
+    using Hopcroft-Karp: every phase finds, with a breadth-first search from
+    the unplaced students, how far each student is from a room with space
+    left (moving students along the way), and then places as many unplaced
+    students as possible along those shortest paths. That takes O(E sqrt(V))
+    instead of a search over every schedule.
+
+    Rooms missing from room_capacities can't take anyone.
+
+    Returns the same dictionary as satisfying_assignment on the formula from
+    boolify_scheduling_problem (a boolean for every student_room variable),
+    or None if no schedule exists.
+    """
+    # rooms each student can go to, without repeats
+    options = {student: [room for room in dict.fromkeys(listed)
+                         if room_capacities.get(room, 0) > 0]
+               for student, listed in student_preferences.items()}
+    # room of every placed student, and students in every room
+    placed = {}
+    members = {room: set() for room in room_capacities}
+
+    def move(student, room):
+        if student in placed:
+            members[placed[student]].remove(student)
+        placed[student] = room
+        members[room].add(student)
+
+    def moves(student):
+        # (room, student to move out of it, or None if it has space) for
+        # every way to place the student
+        for room in options[student]:
+            if room == placed.get(student):
+                continue
+            if len(members[room]) < room_capacities[room]:
+                yield room, None
+                return
+            for other in list(members[room]):
+                yield room, other
+
+    def augment(student):
+        # try to place the student, moving students one layer further away
+        # out of full rooms. A depth-first search with an explicit stack, as
+        # the chains of moved students can be much longer than the recursion
+        # limit: path holds every student on the chain with the moves left
+        # to try from it, and rooms the room each of them would move into
+        path = [(student, moves(student))]
+        rooms = []
+        while path:
+            student, left = path[-1]
+            for room, other in left:
+                if other is None:
+                    # room with space left: move every student on the chain,
+                    # the last one first
+                    rooms.append(room)
+                    for (student, _), room in reversed(list(zip(path, rooms))):
+                        move(student, room)
+                    return True
+                if layer.get(other) == layer[student] + 1:
+                    rooms.append(room)
+                    path.append((other, moves(other)))
+                    break
+            else:
+                # nothing to find from this student in this phase
+                layer[student] = None
+                path.pop()
+                if rooms:
+                    rooms.pop()
+        return False
+
+    while True:
+        # breadth-first search from every unplaced student
+        queue = [student for student in options if student not in placed]
+        layer = {student: 0 for student in queue}
+        reached = set()
+        found = False
+        i = 0
+        while i < len(queue):
+            student = queue[i]
+            i += 1
+            for room in options[student]:
+                if room == placed.get(student) or room in reached:
+                    continue
+                reached.add(room)
+                if len(members[room]) < room_capacities[room]:
+                    found = True
+                elif not found:
+                    for other in members[room]:
+                        if other not in layer:
+                            layer[other] = layer[student] + 1
+                            queue.append(other)
+        if not found:
+            break
+        for student in options:
+            if student not in placed and layer.get(student) == 0:
+                augment(student)
+
+    if len(placed) < len(options):
+        return None
+    return {student + "_" + room: placed[student] == room
+            for student in student_preferences for room in room_capacities}
+
+def solve_scheduling_problem(student_preferences, room_capacities, extra_clauses=None,
+                             cache=None, **options):
     """
-    rule1 = students_in_desired_sessions(student_preferences)
-    rule2 = assign_to_one_room_only(student_preferences, room_capacities)
-    rule3 = no_oversubscribed_session(student_preferences, room_capacities)
+    Finds a schedule for a quiz room scheduling problem, as a dictionary from
+    student_room variables to booleans, or None if there is none.
+
+    Plain problems are solved by schedule_by_matching without any search.
+    Only when extra_clauses (a CNF formula over the same student_room
+    variables) are given does the problem go through
+    boolify_scheduling_problem, with the given options, and
+    satisfying_assignment. Auxiliary variables are left out either way.
 
-    return rule1 + rule2 + rule3
+    cache, if given, is a ResultCache that answers problems it has seen
+    before (see scheduling_key) without solving them again.
+
+    >>> solve_scheduling_problem({'Alice': ['basement', 'kitchen'], 'Bob': ['kitchen']},
+    ...                          {'basement': 1, 'kitchen': 1})
+    {'Alice_basement': True, 'Alice_kitchen': False, 'Bob_basement': False, 'Bob_kitchen': True}
+    >>> solve_scheduling_problem({'Alice': ['basement', 'kitchen'], 'Bob': ['kitchen']},
+    ...                          {'basement': 1, 'kitchen': 1}, [[('Alice_kitchen', True)]])
+    """
+    if cache is not None:
+        key = scheduling_key(student_preferences, room_capacities, extra_clauses, **options)
+        schedule = cache.get(key, _MISSING)
+        if schedule is _MISSING:
+            schedule = solve_scheduling_problem(student_preferences, room_capacities,
+                                                extra_clauses, **options)
+            cache.put(key, schedule)
+        return schedule
+    if not extra_clauses:
+        return schedule_by_matching(student_preferences, room_capacities)
+    cnf = CNF.from_formula(scheduling_clauses(student_preferences, room_capacities, **options))
+    for clause in extra_clauses:
+        cnf.add_clause(clause)
+    assignment = satisfying_assignment(cnf)
+    if assignment is None:
+        return None
+    return {var: val for var, val in assignment.items() if not is_auxiliary(var)}
 
 
 if __name__ == '__main__':
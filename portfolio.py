@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Portfolio solving: the same formula is solved by several differently
+configured searches at once, each in a process of its own so that they run
+on separate cores, and whichever answers first wins. Solvers behave very
+differently on the same hard formula, so the fastest of a few of them is
+usually much faster than any single one.
+
+A configuration is a dictionary of keyword arguments for
+lab.satisfying_assignment (mode, heuristic, phase_saving, restarts, ...),
+plus two keys of its own:
+    seed: the variables are interned in a random order drawn from this seed,
+        which changes how the heuristics break ties
+    phase: the value every variable gets the first time it is decided
+        (with phase saving, which the 'cdcl' mode uses by default)
+
+The 'cdcl' configurations can share the short clauses they learn: every
+learned clause with at most share literals is sent to the other 'cdcl'
+workers, which add it at their next restart.
+"""
+
+import multiprocessing
+import queue
+import random
+import traceback
+
+import lab
+
+
+# a mix of configurations that tend to do well on different formulas
+DEFAULT_CONFIGURATIONS = [
+    {'mode': 'cdcl'},
+    {'mode': 'cdcl', 'restarts': 'luby', 'seed': 1},
+    {'mode': 'cdcl', 'phase': True, 'seed': 2},
+    {'mode': 'cdcl', 'heuristic': 'jw', 'seed': 3},
+    {'mode': 'trail', 'heuristic': 'jw'},
+    {'mode': 'cdcl', 'restarts': 'luby', 'phase': True, 'seed': 4},
+    {'mode': 'trail', 'heuristic': 'moms', 'phase_saving': True},
+    {'mode': 'cdcl', 'restarts': None, 'seed': 5},
+]
+
+
+class ClauseExchange:
+    """
+    Sends the short clauses a Solver learns to the other workers and hands
+    it the ones they sent (see the exchange argument of lab.Solver).
+    Clauses travel with variable names, as every worker numbers the
+    variables in its own order.
+    """
+    def __init__(self, cnf, inbox, outboxes, share):
+        self.cnf = cnf
+        self.inbox = inbox
+        self.outboxes = outboxes
+        self.share = share
+
+    def export(self, clause):
+        if len(clause) > self.share:
+            return
+        names = self.cnf.names
+        named = [(names[lit >> 1], not lit & 1) for lit in clause]
+        for outbox in self.outboxes:
+            outbox.put(named)
+
+    def collect(self):
+        ids = self.cnf.ids
+        while True:
+            try:
+                named = self.inbox.get_nowait()
+            except queue.Empty:
+                return
+            # clauses over variables this CNF doesn't have (from another
+            # component, or gone to preprocessing or pure literals) aren't
+            # needed here
+            if all(name in ids for name, val in named):
+                yield [2*ids[name] + (0 if val else 1) for name, val in named]
+
+
+def solve_configuration(formula, configuration, exchange=None):
+    """
+    Solves a formula (list of clauses of (variable, boolean) literals) with
+    one portfolio configuration.
+
+    exchange, if given, is called with the CNF of every Solver of the worker
+    (see lab.cdcl_search's prepare) and returns its ClauseExchange.
+
+    Returns the model as a dictionary, or None if there is none.
+    """
+    options = dict(configuration)
+    seed = options.pop('seed', None)
+    phase = options.pop('phase', None)
+
+    cnf = lab.CNF()
+    if seed is not None:
+        names = list(dict.fromkeys(name for clause in formula for name, val in clause))
+        random.Random(seed).shuffle(names)
+        for name in names:
+            cnf.var(name)
+    for clause in formula:
+        cnf.add_clause(clause)
+
+    if options.get('mode') == 'cdcl' and (phase is not None or exchange is not None):
+        # cdcl configurations that need to get at their Solver, one for
+        # every component the formula decomposes into
+        def prepare(solver):
+            if phase is not None:
+                solver.heuristic.phase = [phase] * solver.cnf.n
+            if exchange is not None:
+                solver.exchange = exchange(solver.cnf)
+        options['prepare'] = prepare
+    return lab.satisfying_assignment(cnf, **options)
+
+
+def _worker(index, formula, configuration, results, inbox, outboxes, share):
+    exchange = None
+    if share:
+        def exchange(cnf):
+            return ClauseExchange(cnf, inbox, outboxes, share)
+    try:
+        results.put((index, True, solve_configuration(formula, configuration, exchange)))
+    except Exception:
+        results.put((index, False, traceback.format_exc()))
+
+
+def portfolio_assignment(formula, configurations=None, workers=None, share=0):
+    """
+    Solves a formula (list of clauses of (variable, boolean) literals, or a
+    lab.CNF) with several configurations in parallel, one process each, and
+    returns the answer of whichever finishes first, like
+    lab.satisfying_assignment: a model as a dictionary, or None. The other
+    processes are stopped right away.
+
+    configurations: list of configurations (see the top of this module),
+        DEFAULT_CONFIGURATIONS by default.
+    workers: how many of the configurations to run, one per CPU core by
+        default.
+    share: longest learned clause the 'cdcl' workers send each other, 0 for
+        no sharing.
+
+    Raises a RuntimeError if every worker fails.
+    """
+    if isinstance(formula, lab.CNF):
+        formula = list(formula.clauses())
+    else:
+        formula = [[(name, val) for name, val in clause] for clause in formula]
+    if configurations is None:
+        configurations = DEFAULT_CONFIGURATIONS
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    configurations = configurations[:max(workers, 1)]
+
+    results = multiprocessing.Queue()
+    inboxes = [multiprocessing.Queue() if share and configuration.get('mode') == 'cdcl' else None
+               for configuration in configurations]
+    processes = []
+    for i, configuration in enumerate(configurations):
+        outboxes = [inbox for j, inbox in enumerate(inboxes) if inbox is not None and j != i]
+        process = multiprocessing.Process(
+            target=_worker, daemon=True,
+            args=(i, formula, configuration, results, inboxes[i], outboxes, share))
+        process.start()
+        processes.append(process)
+
+    try:
+        errors = []
+        while len(errors) < len(processes):
+            try:
+                index, ok, result = results.get(timeout=0.1)
+            except queue.Empty:
+                # a worker that got killed never reports back
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    errors.append("some workers stopped without an answer")
+                    break
+                continue
+            if ok:
+                return result
+            errors.append(result)
+        raise RuntimeError("every portfolio worker failed:\n" + "\n".join(errors))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        for inbox in inboxes:
+            if inbox is not None:
+                # don't wait for clauses nobody is going to read anymore
+                inbox.cancel_join_thread()
+                inbox.close()
+        results.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import dimacs
+
+    parser = argparse.ArgumentParser(description="Solve a DIMACS CNF file with a portfolio")
+    parser.add_argument("path")
+    parser.add_argument("--mapping")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--share", type=int, default=0)
+    parsed = parser.parse_args()
+
+    cnf = dimacs.read_dimacs(parsed.path, parsed.mapping)
+    model = portfolio_assignment(cnf, workers=parsed.workers, share=parsed.share)
+    dimacs.print_result(model, cnf)
@@ -2,6 +2,7 @@
 from RPCServerHandler import RPCServerHandler
 import socketserver, os, atexit, json
 import wrapper
+import batch
 
 # Initialize all the things
 PORT = 6009
@@ -62,6 +63,10 @@ RPCServerHandler.register_function(lambda d : cat_file( d['path'] ), 'cat')
 # returns json object encoded by a file
 RPCServerHandler.register_function(lambda d : load_json_file( d['path'] ), 'load_json')
 
+# solve_many: solve a batch of formulas or scheduling problems in parallel
+# returns one JSON line per problem as it's solved (see batch.solve_many_json)
+RPCServerHandler.register_stream(batch.solve_many_json, 'solve_many')
+
 # call: call student code
 # returns return value
 RPCServerHandler.register_module("wrapper")
@@ -1,8 +1,25 @@
 #!/usr/bin/env python3
 import os
 import lab
+import cubes
+import dimacs
+import json_cnf
+import bench
+import async_server
+import batch
+from RPCServerHandler import RPCServerHandler
+import socketserver
+import portfolio
 import json
 import copy
+import shutil
+import random
+import queue
+import threading
+import importlib
+import time
+import asyncio
+import urllib.request, urllib.error
 
 import pytest
 
@@ -27,21 +44,28 @@ def _open_case(casename):
         s_f_2 = sorted(res, key=len)
         return res, rev, rev_f, s_f, s_f_2
 
-def _satisfiable(cnf):
-    assignment = lab.satisfying_assignment(copy.deepcopy(cnf))
+def _read_case(casename):
+    # the same formula as _open_case, read straight into a lab.CNF (without
+    # its repeated literals and always satisfied clauses)
+    return json_cnf.read_json_cnf(os.path.join(TEST_DIRECTORY, casename + ".json"))
+
+def _satisfiable(cnf, **kwargs):
+    assignment = lab.satisfying_assignment(copy.deepcopy(cnf), **kwargs)
+    if isinstance(cnf, lab.CNF):
+        cnf = cnf.clauses()
     assert all(any(variable in assignment and assignment[variable] == polarity
                    for variable, polarity in clause)
                for clause in cnf)
 
 
-def _unsatisfiable(cnf):
-    assignment = lab.satisfying_assignment(copy.deepcopy(cnf))
+def _unsatisfiable(cnf, **kwargs):
+    assignment = lab.satisfying_assignment(copy.deepcopy(cnf), **kwargs)
     assert assignment is None
 
 
-def _test_from_file(casename, testfunc):
-    for cnf in _open_case(casename):
-        testfunc(cnf)
+def _test_from_file(casename, testfunc, **kwargs):
+    for cnf in _open_case(casename) + (_read_case(casename),):
+        testfunc(cnf, **kwargs)
 
 
 ## TESTS FOR SAT SOLVER
@@ -98,6 +122,927 @@ def test_sat_big_I():
     _test_from_file('I', _satisfiable)
 
 
+## TESTS FOR COPY MODE
+
+def test_copy_small_nested_backtrack():
+    cnf = [[("a",True), ("b",True)], [("a",False), ("b",False), ("c",True)],
+           [("b",True),("c",True)], [("b",True),("c",False)]]
+    _satisfiable(cnf, mode='copy')
+
+def test_copy_big_sat():
+    for casename in ('A', 'B', 'C', 'F'):
+        _test_from_file(casename, _satisfiable, mode='copy')
+
+def test_copy_big_unsat():
+    for casename in ('D', 'E'):
+        _test_from_file(casename, _unsatisfiable, mode='copy')
+
+
+## TESTS FOR CDCL MODE
+
+def test_cdcl_small_deep_double_backtrack():
+    cnf = [[("d",True),("b",True)],[("a",True),("b",True)], [("a",False),("b",False),("c",True)],
+    [("b",True),("c",True)], [("b",True),("c",False)], [("a",False),("b",False),("c",False)]]
+    _satisfiable(cnf, mode='cdcl')
+
+def test_cdcl_pigeonhole_unsat():
+    # 4 pigeons can't fit in 3 holes, which needs learning across many levels
+    pigeons, holes = range(4), range(3)
+    cnf = [[("p%s_%s" % (p, h), True) for h in holes] for p in pigeons]
+    cnf += [[("p%s_%s" % (p, h), False), ("p%s_%s" % (q, h), False)]
+            for h in holes for p in pigeons for q in pigeons if p < q]
+    _unsatisfiable(cnf, mode='cdcl')
+
+def test_cdcl_big_sat():
+    for casename in ('A', 'B', 'C', 'F', 'H', 'I'):
+        _test_from_file(casename, _satisfiable, mode='cdcl', fast_paths=False)
+
+def test_cdcl_big_unsat():
+    for casename in ('D', 'E', 'G'):
+        _test_from_file(casename, _unsatisfiable, mode='cdcl', fast_paths=False)
+
+def test_cdcl_sudoku3():
+    result = lab.satisfying_assignment(_get_sudoku(3), mode='cdcl')
+    _check_sudoku([[0]*9 for _ in range(9)], _assignment_to_grid(result))
+
+
+## TESTS FOR COMPACT REPRESENTATION
+
+def test_cnf_repeated_literals():
+    cnf = lab.CNF.from_formula([[("a",True), ("b",False), ("a",True)],
+                                [("a",True), ("a",False), ("a",True)],
+                                [("b",True)]])
+    # the second clause is always satisfied, so it's dropped
+    assert cnf.names == ["a", "b"]
+    assert [list(cnf.clause(i)) for i in range(len(cnf))] == [[0, 3], [2]]
+
+def test_cnf_tautology_does_not_force():
+    cnf = [[("a",True), ("a",False), ("a",True)], [("a",False)]]
+    for mode in ('trail', 'cdcl', 'copy'):
+        _satisfiable(cnf, mode=mode)
+
+def test_cnf_empty_clause():
+    for mode in ('trail', 'cdcl', 'copy'):
+        _unsatisfiable([[("a",True)], []], mode=mode)
+        _unsatisfiable([[]], mode=mode)
+
+
+## TESTS FOR 2-SAT AND HORN-SAT
+
+def test_formula_kind():
+    assert lab.formula_kind(lab.CNF.from_formula([[("a",True), ("b",True)], [("c",False)]])) == '2cnf'
+    assert lab.formula_kind(lab.CNF.from_formula([[("a",True), ("b",False), ("c",False)]])) == 'horn'
+    assert lab.formula_kind(lab.CNF.from_formula([[("a",True), ("b",True), ("c",False)]])) is None
+
+def test_fast_paths_random():
+    import random
+    rng = random.Random(6009)
+    for _ in range(300):
+        variables = ['x%s' % i for i in range(rng.randint(1, 8))]
+        two_cnf = [[(rng.choice(variables), rng.random() < 0.5) for _ in range(rng.randint(1, 2))]
+                   for _ in range(rng.randint(1, 20))]
+        horn = [[(var, i == 0 and rng.random() < 0.5)
+                 for i, var in enumerate(rng.sample(variables, rng.randint(1, len(variables))))]
+                for _ in range(rng.randint(1, 20))]
+        for cnf, kind in ((two_cnf, '2cnf'), (horn, 'horn')):
+            assert lab.formula_kind(lab.CNF.from_formula(cnf)) in (kind, '2cnf')
+            expected = lab.satisfying_assignment(cnf, fast_paths=False)
+            if expected is None:
+                _unsatisfiable(cnf)
+            else:
+                _satisfiable(cnf)
+
+
+## TESTS FOR PREPROCESSING
+
+def test_preprocessing_big():
+    for casename in ('C', 'F', 'H', 'I'):
+        _test_from_file(casename, _satisfiable, preprocessing=True)
+    for casename in ('D', 'G'):
+        _test_from_file(casename, _unsatisfiable, preprocessing=True, mode='cdcl')
+
+def test_preprocessing_sudoku():
+    result = lab.satisfying_assignment(_get_sudoku(2), preprocessing=True)
+    _check_sudoku([[0]*9 for _ in range(9)], _assignment_to_grid(result))
+
+def test_preprocessing_failed_literal():
+    # a forces both b and c, which can't both be True, so a has to be False
+    cnf = lab.CNF.from_formula([[("a",False), ("b",True)], [("a",False), ("c",True)],
+                                [("b",False), ("c",False)], [("a",True), ("d",True), ("e",True)],
+                                [("d",False), ("e",True), ("f",True)]])
+    preprocessor = lab.Preprocessor(cnf, eliminate=False)
+    reduced = preprocessor.run()
+    assert preprocessor.report['failed_literals'] >= 1
+    assert [("a", False)] in list(reduced.clauses())
+
+def test_preprocessing_reconstruction():
+    cnf = [[("a",True), ("b",True)], [("a",False), ("c",True)], [("b",False), ("c",False)],
+           [("c",True), ("d",True)]]
+    preprocessor = lab.Preprocessor(lab.CNF.from_formula(cnf), probe=False, frozen=[3])
+    reduced = preprocessor.run()
+    assert preprocessor.report['eliminated'] == 3
+    assert [lit >> 1 for lit in reduced.lits] == []
+    vals = bytearray([lab.UNSET]) * 8
+    vals[6], vals[7] = lab.TRUE, lab.FALSE
+    model = reduced.model(preprocessor.extend(vals))
+    assert all(any(model[variable] == polarity for variable, polarity in clause)
+               for clause in cnf)
+
+
+## TESTS FOR DECOMPOSITION
+
+def test_decompose_pure_literals():
+    # a is pure, and once its clauses are gone so is not b
+    cnf = lab.CNF.from_formula([[("a",True), ("b",True)], [("a",True), ("c",False)],
+                                [("b",False), ("c",True)], [("d",True), ("e",True)],
+                                [("d",False), ("e",False)]])
+    vals, components = lab.decompose(cnf)
+    assert vals[0] == lab.TRUE and vals[3] == lab.TRUE
+    assert [component.names for component, variables in components] == [['d', 'e']]
+    assert components[0][1] == [3, 4]
+
+def test_decompose_components():
+    # three copies of a small formula over different variables
+    formula = []
+    for copy_ in 'xyz':
+        formula += [[(copy_ + v, p) for v, p in clause]
+                    for clause in [[('1',True), ('2',True)], [('1',False), ('2',False)],
+                                   [('2',True), ('3',False)], [('2',False), ('3',True)]]]
+    vals, components = lab.decompose(lab.CNF.from_formula(formula))
+    assert sorted(len(variables) for component, variables in components) == [3, 3, 3]
+    for mode in ('trail', 'cdcl'):
+        _satisfiable(formula, mode=mode, fast_paths=False)
+    # one unsatisfiable component makes the whole formula unsatisfiable
+    formula += [[('y2', True)], [('y3', False)]]
+    for mode in ('trail', 'cdcl'):
+        _unsatisfiable(formula, mode=mode, fast_paths=False)
+
+def test_decomposition_big():
+    for mode in ('trail', 'cdcl'):
+        for decomposition in (False, True):
+            _test_from_file('F', _satisfiable, mode=mode, decomposition=decomposition)
+            _test_from_file('E', _unsatisfiable, mode=mode, decomposition=decomposition)
+
+
+## TESTS FOR INCREMENTAL SOLVING
+
+def test_solver_assumptions():
+    cnf = _open_case('C')[1]
+    solver = lab.Solver(cnf)
+    model = solver.solve()
+    for variable in list(model)[:10]:
+        for polarity in (True, False):
+            result = solver.solve(assumptions=[(variable, polarity)])
+            expected = lab.satisfying_assignment(cnf + [[(variable, polarity)]], mode='cdcl')
+            assert (result is None) == (expected is None)
+            if result is not None:
+                assert result[variable] == polarity
+                assert all(any(result[v] == p for v, p in clause) for clause in cnf)
+
+def test_solver_push_pop():
+    solver = lab.Solver([[("a",True), ("b",True)], [("b",False), ("c",True)]])
+    solver.push()
+    solver.add_clause([("a",False)])
+    solver.push()
+    solver.add_clause([("c",False)])
+    assert solver.solve() is None
+    solver.pop()
+    assert solver.solve() == {"a": False, "b": True, "c": True}
+    solver.pop()
+    model = solver.solve(assumptions=[("b",False)])
+    assert model["a"] and not model["b"]
+    # a clause that can't hold with the permanent ones only makes its group unsatisfiable
+    solver.push()
+    solver.add_clause([("a",False)])
+    solver.add_clause([("b",False)])
+    assert solver.solve() is None
+    solver.pop()
+    assert solver.solve() is not None
+    solver.add_clause([("a",False)])
+    solver.add_clause([("c",False)])
+    assert solver.solve() is None
+
+def test_solver_scheduling():
+    students, sessions = _open_scheduling_case('B_Sat')
+    solver = lab.Solver(lab.boolify_scheduling_problem(students, sessions))
+    for session in sessions:
+        # close the session for one solve
+        closed = [(student + '_' + session, False) for student in students]
+        sched = solver.solve(assumptions=closed)
+        fewer = {student: [s for s in wanted if s != session]
+                 for student, wanted in students.items()}
+        if sched is None:
+            assert lab.schedule_by_matching(fewer, sessions) is None
+        else:
+            _check_schedule(fewer, sessions, sched, auxiliary=True)
+    # one student changing their preferences for a while
+    student = next(iter(students))
+    solver.push()
+    for session in sessions:
+        if session in students[student]:
+            solver.add_clause([(student + '_' + session, False)])
+    assert solver.solve() is None
+    solver.pop()
+    _check_schedule(students, sessions, solver.solve(), auxiliary=True)
+
+
+def test_restarts_big():
+    for restarts in ('luby', 'glucose', None):
+        options = {'mode': 'cdcl', 'fast_paths': False, 'restarts': restarts,
+                   'restart_interval': 1, 'clause_budget': 10}
+        _test_from_file('F', _satisfiable, **options)
+        _test_from_file('D', _unsatisfiable, **options)
+        _test_from_file('E', _unsatisfiable, **options)
+
+def _random_3sat(variables, clauses, seed):
+    rng = random.Random(seed)
+    return [[("x%d" % v, rng.random() < .5) for v in rng.sample(range(variables), 3)]
+            for _ in range(clauses)]
+
+def test_clause_database_budget():
+    formula = _random_3sat(60, 240, 0)
+    solver = lab.Solver(formula, restarts=None, clause_budget=10**6)
+    assert solver.search() is not None
+    assert solver.learned
+    for c, lbd in solver.learned.items():
+        assert 1 <= lbd <= len(solver.cnf.clause(c))
+    solver.backtrack()
+    solver.reduce(4)
+    assert len(solver.learned) <= 2
+    model = solver.solve()
+    assert all(any(model[v] == p for v, p in clause) for clause in formula)
+
+def test_clause_database_reduce_keeps_formula():
+    # reduce rewrites the CNF it was given, into an equivalent one
+    formula = _random_3sat(20, 80, 0)
+    # a unit clause that leaves the formula satisfiable, for level 0 to fix
+    unit = [formula[0][0]]
+    cnf = lab.CNF.from_formula(formula)
+    solver = lab.Solver(cnf, restarts=None)
+    solver.add_clause(unit)
+    assert solver.search() is not None
+    solver.backtrack()
+    solver.reduce(0)
+    assert len(cnf.lits) < sum(len(clause) for clause in formula) + 1
+    assert lab.count_models(cnf) == lab.count_models(formula + [unit])
+
+def test_restarts_unknown():
+    with pytest.raises(ValueError):
+        lab.Solver([], restarts='sometimes')
+
+
+## TESTS FOR PORTFOLIO SOLVING
+
+def test_portfolio_configurations():
+    formula = _random_3sat(60, 240, 0)
+    for configuration in portfolio.DEFAULT_CONFIGURATIONS:
+        model = portfolio.solve_configuration(formula, configuration)
+        assert all(any(model[v] == p for v, p in clause) for clause in formula)
+
+def test_portfolio_configuration_options():
+    formula = _random_3sat(60, 240, 0)
+    # two independent copies of the formula, as two components
+    renamed = [[(v + "'", p) for v, p in clause] for clause in formula]
+    exchanges = []
+    def exchange(cnf):
+        inbox = queue.Queue()
+        # a variable it doesn't have, which it has to leave out
+        inbox.put([("x0", True), ("nowhere", False)])
+        exchanges.append(portfolio.ClauseExchange(cnf, inbox, [queue.Queue()], 3))
+        return exchanges[-1]
+    for extra in ({'preprocessing': True}, {'fast_paths': False}, {'decomposition': False}):
+        configuration = dict({'mode': 'cdcl', 'phase': True}, **extra)
+        for exchanged in (None, exchange):
+            model = portfolio.solve_configuration(formula + renamed, configuration, exchanged)
+            assert all(any(model[v] == p for v, p in clause) for clause in formula + renamed)
+    # every component got a Solver with an exchange of its own
+    assert len(exchanges) == 5
+
+def test_portfolio_big():
+    configurations = [{'mode': 'cdcl', 'seed': 1}, {'mode': 'cdcl', 'phase': True, 'restarts': 'luby'}]
+    for share in (0, 3):
+        options = {'workers': 2, 'share': share, 'configurations': configurations}
+        model = portfolio.portfolio_assignment(_get_sudoku(3), **options)
+        _check_sudoku([[0]*9 for _ in range(9)], _assignment_to_grid(model))
+        students, sessions = _open_scheduling_case('C_Unsat')
+        formula = lab.boolify_scheduling_problem(students, sessions)
+        assert portfolio.portfolio_assignment(formula, **options) is None
+
+def test_portfolio_errors():
+    with pytest.raises(RuntimeError):
+        portfolio.portfolio_assignment([[("a",True)]], [{'mode': 'nonsense'}])
+
+
+## TESTS FOR CUBE-AND-CONQUER
+
+def test_make_cubes():
+    import itertools
+    formula = _random_3sat(12, 50, 1)
+    names = sorted({v for clause in formula for v, p in clause})
+    cubes_ = cubes.make_cubes(formula, depth=3)
+    assert 1 < len(cubes_) <= 8
+    # every model of the formula agrees with some cube
+    for values in itertools.product((False, True), repeat=len(names)):
+        model = dict(zip(names, values))
+        if all(any(model[v] == p for v, p in clause) for clause in formula):
+            assert any(all(model[v] == p for v, p in cube) for cube in cubes_)
+    assert cubes.make_cubes([[("a",True)], [("a",False), ("b",True)], [("b",False)]]) == []
+
+def test_cube_and_conquer_big():
+    formula = _random_3sat(60, 240, 0)
+    model = cubes.cube_and_conquer(formula, workers=2)
+    assert all(any(model[v] == p for v, p in clause) for clause in formula)
+    students, sessions = _open_scheduling_case('C_Unsat')
+    formula = lab.boolify_scheduling_problem(students, sessions)
+    assert cubes.cube_and_conquer(formula, workers=2, depth=3) is None
+    model = cubes.cube_and_conquer(_get_sudoku(3), workers=3)
+    _check_sudoku([[0]*9 for _ in range(9)], _assignment_to_grid(model))
+
+
+## TESTS FOR ENUMERATION AND COUNTING
+
+def test_all_satisfying_assignments():
+    import itertools
+    formula = _random_3sat(10, 30, 2)
+    names = sorted({v for clause in formula for v, p in clause})
+    expected = []
+    for values in itertools.product((False, True), repeat=len(names)):
+        model = dict(zip(names, values))
+        if all(any(model[v] == p for v, p in clause) for clause in formula):
+            expected.append(model)
+    found = list(lab.all_satisfying_assignments(formula))
+    assert len(found) == len(expected) and all(model in expected for model in found)
+    assert lab.count_models(formula) == len(expected)
+    # the same on the representation parse_formula makes
+    parsed = lab.parse_formula(formula)[0]
+    assert len(list(lab.all_satisfying_assignments(parsed))) == len(expected)
+    assert lab.count_models(parsed) == len(expected)
+    # projected on three variables
+    found = list(lab.all_satisfying_assignments(formula, names[:3]))
+    assert sorted(tuple(m.values()) for m in found) == sorted({tuple(m[v] for v in names[:3])
+                                                              for m in expected})
+
+def test_all_satisfying_assignments_lazy():
+    models = lab.all_satisfying_assignments(_get_sudoku(2))
+    _check_sudoku([[0]*9 for _ in range(9)], _assignment_to_grid(next(models)))
+    assert lab.count_models(_get_sudoku(2)) == 5
+    assert lab.count_models(_get_sudoku(1)) == 1
+    assert lab.count_models([[("a",True)], [("a",False)]]) == 0
+    assert list(lab.all_satisfying_assignments([[("a",True)], [("a",False)]])) == []
+
+def test_count_schedules():
+    students = {'A': ['r1', 'r2'], 'B': ['r1', 'r2', 'r3'], 'C': ['r2', 'r3'], 'D': ['r1', 'r3']}
+    rooms = {'r1': 2, 'r2': 1, 'r3': 2}
+    formula = lab.boolify_scheduling_problem(students, rooms)
+    schedules = list(lab.all_satisfying_assignments(formula))
+    for sched in schedules:
+        _check_schedule(students, rooms, sched)
+    assert lab.count_models(formula) == len(schedules) == 10
+
+def test_count_models_deep(monkeypatch):
+    # a chain of clauses gets counted one variable after the other, far
+    # deeper than Python's default recursion limit, which count_models has
+    # to leave alone as other threads rely on it
+    n = 1500
+    formula = [[("x%s" % i, True), ("x%s" % (i + 1), True)] for i in range(n)]
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)
+    def set_limit(limit):
+        raise AssertionError("count_models changed the recursion limit")
+    monkeypatch.setattr(sys, 'setrecursionlimit', set_limit)
+    try:
+        count = lab.count_models(formula)
+    finally:
+        monkeypatch.undo()
+        sys.setrecursionlimit(limit)
+    # no two neighbours both False: a Fibonacci number
+    a, b = 1, 1
+    for _ in range(n + 2):
+        a, b = b, a + b
+    assert count == a
+
+
+## TESTS FOR STATISTICS
+
+def test_stats():
+    formula = _random_3sat(40, 170, 3)
+    small = [[("a",True), ("b",True)], [("a",False), ("b",True)], [("a",True), ("b",False)]]
+    for mode, cnf, phases in (('trail', formula, {'parse', 'decompose', 'search'}),
+                              ('cdcl', formula, {'parse', 'decompose', 'search'}),
+                              ('copy', small, {'parse', 'copy', 'simplify', 'unit_scan'})):
+        stats = lab.Stats()
+        lab.satisfying_assignment(copy.deepcopy(cnf), mode=mode, stats=stats)
+        assert stats.decisions > 0 and stats.propagations > 0
+        assert 0 < stats.backtracks <= stats.conflicts
+        assert 0 < stats.max_depth
+        assert stats.peak_size >= sum(len(clause) for clause in cnf) - 3
+        assert set(stats.times) == phases
+        assert set(stats.as_dict()) >= {'decisions', 'propagations', 'conflicts', 'backtracks',
+                                        'max_depth', 'peak_size', 'times'}
+
+def test_stats_progress():
+    calls = []
+    stats = lab.Stats(progress=lambda stats: calls.append(stats.conflicts), progress_interval=5)
+    _unsatisfiable(_random_3sat(40, 170, 3), mode='cdcl', stats=stats)
+    assert stats.conflicts > 5
+    assert calls == list(range(5, stats.conflicts + 1, 5))
+
+
+## TESTS FOR BUDGETS
+
+def test_budget_conflicts():
+    formula = _random_3sat(40, 170, 3)
+    for mode in ('trail', 'cdcl'):
+        stats = lab.Stats()
+        budget = lab.Budget(max_conflicts=10)
+        result = lab.satisfying_assignment(copy.deepcopy(formula), mode=mode, stats=stats, budget=budget)
+        assert result is lab.UNKNOWN
+        assert budget.reason == 'conflicts'
+        assert 10 <= stats.conflicts < 20
+    # the same formula is still unsatisfiable without a budget
+    _unsatisfiable(formula, mode='cdcl', budget=lab.Budget(max_conflicts=10**6))
+
+def test_budget_timeout_and_cancel():
+    formula = _random_3sat(150, 639, 1)
+    for mode in ('trail', 'cdcl'):
+        budget = lab.Budget(timeout=0.2)
+        result = lab.satisfying_assignment(copy.deepcopy(formula), mode=mode, budget=budget)
+        assert result is lab.UNKNOWN and budget.reason == 'timeout'
+
+        budget = lab.Budget()
+        timer = threading.Timer(0.2, budget.cancel)
+        timer.start()
+        result = lab.satisfying_assignment(copy.deepcopy(formula), mode=mode, budget=budget)
+        timer.join()
+        assert result is lab.UNKNOWN and budget.reason == 'cancelled'
+
+def test_budget_size():
+    small = [[("a",True), ("b",True)], [("a",False), ("b",True)], [("a",True), ("b",False)]]
+    budget = lab.Budget(max_size=3)
+    assert lab.satisfying_assignment(copy.deepcopy(small), mode='copy', budget=budget) is lab.UNKNOWN
+    assert budget.reason == 'size'
+    _satisfiable(small, mode='copy', budget=lab.Budget(max_size=100))
+
+def test_budget_incremental():
+    solver = lab.Solver(_random_3sat(40, 170, 3))
+    assert solver.solve(budget=lab.Budget(max_conflicts=5)) is lab.UNKNOWN
+    assert solver.solve(budget=lab.Budget(max_decisions=0)) is lab.UNKNOWN
+    assert solver.solve() is None
+
+
+## TESTS FOR THE RESULT CACHE
+
+def test_result_cache_permutations():
+    cache = lab.ResultCache()
+    for casename in ('A', 'D', 'sudoku1'):
+        keys = {lab.formula_key(cnf) for cnf in _open_case(casename)}
+        assert len(keys) == 1
+    _test_from_file('A', _satisfiable, cache=cache)
+    _test_from_file('D', _unsatisfiable, cache=cache)
+    # D.json has clauses with both literals of a variable, which the CNF
+    # read from it leaves out, so that's a formula (and a key) of its own
+    assert (cache.hits, cache.misses) == (9, 3)
+    # every hit is a copy of its own
+    cnf = _open_case('A')[0]
+    lab.satisfying_assignment(cnf, cache=cache).clear()
+    _satisfiable(cnf, cache=cache)
+
+def test_result_cache_budget_and_unknown():
+    formula = _random_3sat(40, 170, 3)
+    cache = lab.ResultCache()
+    assert lab.satisfying_assignment(formula, mode='cdcl', cache=cache,
+                                     budget=lab.Budget(max_conflicts=1)) is lab.UNKNOWN
+    assert lab.satisfying_assignment(formula, mode='cdcl', cache=cache) is None
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    cache = lab.ResultCache(max_bytes=1000)
+    formulas = [[[('x%d' % i, True)]] for i in range(100)]
+    for formula in formulas:
+        lab.satisfying_assignment(formula, cache=cache)
+    assert 0 < cache.size <= 1000 and len(cache.entries) < 100
+    # the oldest ones went first
+    assert cache.get(lab.formula_key(formulas[0])) is None
+    assert cache.get(lab.formula_key(formulas[-1])) == {'x99': True}
+
+def test_result_cache_directory(tmp_path):
+    students, sessions = _open_scheduling_case('B_Sat')
+    cache = lab.ResultCache(directory=str(tmp_path))
+    sched = lab.solve_scheduling_problem(students, sessions, cache=cache)
+    # a new cache, as after a restart, with nothing in memory
+    cache = lab.ResultCache(max_bytes=0, directory=str(tmp_path))
+    reordered = {student: wanted[::-1] for student, wanted in reversed(list(students.items()))}
+    assert lab.solve_scheduling_problem(reordered, sessions, cache=cache) == sched
+    assert cache.hits == 1
+    assert lab.scheduling_key(students, sessions) != lab.scheduling_key(students, sessions,
+                                                                        [[('x', True)]])
+
+def test_result_cache_disk_limit(tmp_path):
+    cache = lab.ResultCache(directory=str(tmp_path), max_disk_bytes=2000)
+    formulas = [[[('x%d' % i, True)]] for i in range(100)]
+    for i, formula in enumerate(formulas):
+        lab.satisfying_assignment(formula, cache=cache)
+        if i == 0:
+            first = os.path.join(str(tmp_path), lab.formula_key(formula))
+            os.utime(first, (0, 0))
+    assert cache.disk_size <= 2000
+    assert sum(os.path.getsize(str(path)) for path in tmp_path.iterdir()) == cache.disk_size
+    # the files used the longest ago went first
+    assert not os.path.exists(first)
+    assert os.path.exists(os.path.join(str(tmp_path), lab.formula_key(formulas[-1])))
+    assert lab.ResultCache(directory=str(tmp_path)).disk_size == cache.disk_size
+
+def test_result_cache_shared_directory(tmp_path, monkeypatch):
+    cache = lab.ResultCache(directory=str(tmp_path), max_disk_bytes=500)
+    for i in range(5):
+        cache.put('key%d' % i, i)
+    # another process removes a file between listing the directory and
+    # looking at the file
+    scandir = os.scandir
+    def racing_scandir(path):
+        entries = list(scandir(path))
+        os.remove(entries[0].path)
+        return entries
+    monkeypatch.setattr(lab.os, 'scandir', racing_scandir)
+    lab.ResultCache(directory=str(tmp_path))
+    for i in range(5, 100):
+        cache.put('key%d' % i, 'x' * 50)
+    monkeypatch.undo()
+    # or removes the whole directory
+    shutil.rmtree(str(tmp_path))
+    cache.put('gone', 1)
+    assert cache.get('gone') == 1
+
+
+## TESTS FOR BATCH SOLVING
+
+def _batch():
+    problems = [_open_case(casename)[0] for casename in ('A', 'D', 'F', 'E', 'sudoku1')]
+    with open(os.path.join(TEST_DIRECTORY, 'B_Sat.json')) as f:
+        problems.append(json.load(f))
+    return problems, [True, False, True, False, True, True]
+
+def _check_batch_result(problem, result, satisfiable):
+    if batch.is_scheduling_problem(problem):
+        _check_schedule(problem[0], problem[1], result)
+    elif satisfiable:
+        assert all(any(result.get(variable) == polarity for variable, polarity in clause)
+                   for clause in problem)
+    else:
+        assert result is None
+
+def test_solve_many():
+    problems, expected = _batch()
+    for workers, chunksize in ((1, None), (2, None), (3, 1)):
+        results = list(batch.solve_many(problems, workers=workers, chunksize=chunksize, mode='cdcl'))
+        assert sorted(index for index, result in results) == list(range(len(problems)))
+        for index, result in results:
+            _check_batch_result(problems[index], result, expected[index])
+    hard = [_random_3sat(150, 639, 1)] * 2
+    assert [result for index, result in batch.solve_many(hard, workers=2, timeout=0.2)] == [lab.UNKNOWN] * 2
+
+def test_solve_many_rpc():
+    problems, expected = _batch()
+    RPCServerHandler.register_stream(batch.solve_many_json, 'solve_many')
+    httpd = socketserver.ThreadingTCPServer(("localhost", 0), RPCServerHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        data = json.dumps({'problems': problems, 'workers': 2, 'chunksize': 1}).encode()
+        request = urllib.request.Request('http://localhost:%d/solve_many' % httpd.server_address[1],
+                                         data, {'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            assert response.headers['Content-Type'].startswith('application/x-ndjson')
+            lines = [json.loads(line) for line in response]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert sorted(line['index'] for line in lines) == list(range(len(problems)))
+    for line in lines:
+        assert line['status'] == ('sat' if expected[line['index']] else 'unsat')
+        _check_batch_result(problems[line['index']], line['result'], expected[line['index']])
+
+def test_solve_many_rpc_limits_and_errors(monkeypatch):
+    # every request shares one pool of a worker per core, whatever the
+    # client asks for, and no formula runs for ever
+    calls = []
+    def solve_many(problems, workers, chunksize, timeout, pool, **options):
+        calls.append((workers, timeout, pool))
+        return []
+    monkeypatch.setattr(batch, 'solve_many', solve_many)
+    list(batch.solve_many_json({'problems': [], 'workers': 10**6, 'timeout': 10**6}))
+    list(batch.solve_many_json({'problems': []}))
+    cores, pool = batch.multiprocessing.cpu_count(), batch.rpc_pool()
+    assert calls == [(cores, batch.RPC_MAX_TIMEOUT, pool), (cores, batch.RPC_TIMEOUT, pool)]
+
+    def broken(data):
+        yield {'index': 0}
+        raise RuntimeError("solver crashed")
+    RPCServerHandler.register_stream(broken, 'broken')
+    RPCServerHandler.register_stream(batch.solve_many_json, 'solve_many')
+    httpd = socketserver.ThreadingTCPServer(("localhost", 0), RPCServerHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    def post(path, data):
+        return urllib.request.Request('http://localhost:%d/%s' % (httpd.server_address[1], path),
+                                      json.dumps(data).encode(), {'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(post('broken', {})) as response:
+            lines = [json.loads(line) for line in response]
+        # bad requests are turned down before the stream starts
+        for data in ({}, {'problems': 1}, {'problems': [1]}, {'problems': [], 'chunksize': 'a'},
+                     {'problems': [], 'timeout': -1}, {'problems': [], 'options': []}):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(post('solve_many', data))
+            assert error.value.code == 400
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert lines == [{'index': 0}, {'error': 'RuntimeError: solver crashed'}]
+
+
+## TESTS FOR BENCHMARKS
+
+def test_bench_cases():
+    names = [name for name, formula in bench.cases(random_sizes=(20,), scheduling_sizes=(8,))]
+    assert {'A/original', 'A/by_length', 'sudoku3/sorted', 'C_Unsat', '3sat/20/0',
+            'scheduling/8/0'} <= set(names)
+    assert len(bench.random_3sat(100, 0)) == 426
+    for order in bench.permutations(_random_3sat(10, 30, 0)).values():
+        assert sorted(map(sorted, order)) == sorted(map(sorted, _random_3sat(10, 30, 0)))
+
+def test_bench_run_and_compare():
+    results = bench.run({'mode': 'cdcl'}, repeat=1, select='E/')
+    assert len(results['cases']) == 5
+    for case in results['cases'].values():
+        assert case['result'] == 'unsat' and case['peak_memory'] > 0
+    assert json.loads(json.dumps(results)) == results
+    assert bench.compare(results, results) == []
+
+    slower = copy.deepcopy(results)
+    case = slower['cases']['E/original']
+    case['time'] = max(case['time'], 0.01) * 2
+    case['result'] = 'sat'
+    assert sorted(what for name, what, old, new in bench.compare(slower, results)) == ['result', 'time']
+    assert bench.compare(results, slower) == [('E/original', 'result', 'sat', 'unsat')]
+    assert bench.run_case(_random_3sat(150, 639, 1), {'mode': 'cdcl'}, timeout=0.1)['result'] == 'unknown'
+
+def test_bench_run_case_fastest_answer(monkeypatch):
+    # the answer goes with the time it's reported with, from the same run
+    answers = iter([{'a': True}, lab.UNKNOWN, lab.UNKNOWN])
+    def solve(formula, stats=None, budget=None, **options):
+        answer = next(answers, lab.UNKNOWN)
+        if answer is lab.UNKNOWN:
+            time.sleep(0.05)
+        return answer
+    monkeypatch.setattr(lab, 'satisfying_assignment', solve)
+    case = bench.run_case([[("a", True)]], {}, repeat=3)
+    assert case['result'] == 'sat' and case['time'] < 0.05
+
+
+## TESTS FOR THE ASYNC SERVER
+
+def _post(port, path, data):
+    request = urllib.request.Request('http://localhost:%d/%s' % (port, path), json.dumps(data).encode(),
+                                     {'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, None
+
+def _sleep_and_swallow(seconds):
+    # like ui_assign, answers even when something goes wrong
+    try:
+        time.sleep(seconds)
+    except:
+        return {}
+    return {'slept': seconds}
+
+def test_async_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    students, sessions = _open_scheduling_case('B_Sat')
+    # the workers are forked from here, with the results cached out of the way
+    import wrapper
+    monkeypatch.setattr(wrapper, 'results_root', str(tmp_path))
+    monkeypatch.setattr(wrapper, 'results', None)
+
+    async def requests():
+        server = async_server.make_server(workers=1, queue_size=0, timeout=1)
+        server.register_function(time.sleep, 'sleep', remote=True)
+        server.register_function(abs, 'abs', remote=True)
+        await server.start(port=0)
+        loop = asyncio.get_running_loop()
+        def post(path, data):
+            return loop.run_in_executor(None, _post, server.port, path, data)
+        try:
+            assert await post('restart', {}) == (200, None)
+            status, files = await post('ls', {'path': 'test_inputs'})
+            assert status == 200 and 'B_Sat.json' in files
+            status, sched = await post('ui_assign', [students, sessions])
+            assert status == 200
+            _check_schedule(students, sessions, sched)
+            # the only worker is busy and nothing can wait, and then it's too slow
+            slow = asyncio.ensure_future(post('sleep', 1.5))
+            await asyncio.sleep(0.2)
+            assert (await post('sleep', 0))[0] == 429
+            assert (await post('ls', {'path': 'test_inputs'}))[0] == 200
+            assert (await slow)[0] == 504
+            assert (await post('nothing', {}))[0] == 404
+            # a call that runs far past the timeout doesn't hold up the worker
+            # for the next ones, and counts as in flight until it stops
+            server.timeout = 0.5
+            runaway = asyncio.ensure_future(post('sleep', 5))
+            await asyncio.sleep(0.2)
+            assert server.pending == 1
+            assert (await runaway)[0] == 504
+            start = time.time()
+            assert await post('abs', -1) == (200, 1)
+            assert time.time() - start < 1 and server.pending == 0
+            # an answer the function gives after catching the timeout is no answer
+            server.register_function(_sleep_and_swallow, 'swallow', remote=True)
+            server.timeout = 0.3
+            for _ in range(3):
+                assert (await post('swallow', 2))[0] == 504
+            assert await post('swallow', 0) == (200, {'slept': 0})
+        finally:
+            server.close()
+
+    asyncio.run(requests())
+
+
+## TESTS FOR DIMACS
+
+def test_dimacs_read(tmp_path):
+    path = tmp_path / 'small.cnf'
+    path.write_text("c a comment\np cnf 3 3\n1 -2 0\n2 3\n0 -1 0\n")
+    cnf = dimacs.read_dimacs(str(path))
+    assert cnf.names == ['1', '2', '3']
+    assert list(cnf.clauses()) == [[('1', True), ('2', False)], [('2', True), ('3', True)],
+                                   [('1', False)]]
+    assert lab.satisfying_assignment(cnf) == {'1': False, '2': False, '3': True}
+
+def test_dimacs_round_trip(tmp_path):
+    students, sessions = _open_scheduling_case('B_Sat')
+    formula = lab.boolify_scheduling_problem(students, sessions)
+    path, mapping = str(tmp_path / 'B_Sat.cnf'), str(tmp_path / 'B_Sat.json')
+    dimacs.write_dimacs(formula, path, mapping)
+    cnf = dimacs.read_dimacs(path, mapping)
+    assert list(cnf.clauses()) == list(lab.CNF.from_formula(formula).clauses())
+    assignment = lab.satisfying_assignment(cnf)
+    assert all(any(assignment[variable] == polarity for variable, polarity in clause)
+               for clause in formula)
+
+def test_dimacs_write_stream(tmp_path):
+    students, sessions = _open_scheduling_case('B_Sat')
+    formula = lab.boolify_scheduling_problem(students, sessions)
+    path, mapping = str(tmp_path / 'B_Sat.cnf'), str(tmp_path / 'B_Sat.json')
+    dimacs.write_dimacs(lab.scheduling_clauses(students, sessions), path, mapping)
+    with open(path) as f:
+        assert f.readline().split() == ['p', 'cnf', str(lab.CNF.from_formula(formula).n),
+                                        str(len(formula))]
+    cnf = dimacs.read_dimacs(path, mapping)
+    assert list(cnf.clauses()) == list(lab.CNF.from_formula(formula).clauses())
+
+def test_dimacs_print_result(tmp_path, capsys):
+    path = tmp_path / 'small.cnf'
+    path.write_text("p cnf 3 2\n1 -2 0\n-3 0\n")
+    cnf = dimacs.read_dimacs(str(path))
+    dimacs.print_result(lab.satisfying_assignment(cnf), cnf)
+    status, values = capsys.readouterr().out.splitlines()
+    assert status == "s SATISFIABLE"
+    assert values.startswith("v ") and values.split()[-1] == "0"
+    assert "-3" in values.split() and len(values.split()) == 5
+    dimacs.print_result(None, cnf)
+    dimacs.print_result(lab.UNKNOWN, cnf)
+    assert capsys.readouterr().out.splitlines() == ["s UNSATISFIABLE", "s UNKNOWN"]
+
+
+
+## TESTS FOR JSON INPUT
+
+def test_read_json_cnf():
+    for casename in ('A', 'D', 'G', 'sudoku1'):
+        cnf = json_cnf.read_json_cnf(os.path.join(TEST_DIRECTORY, casename + '.json'))
+        with open(os.path.join(TEST_DIRECTORY, casename + '.json')) as f:
+            expected = lab.CNF.from_formula(json.load(f))
+        assert cnf.names == expected.names
+        assert list(cnf.clauses()) == list(expected.clauses())
+    assert json_cnf.json_kind(os.path.join(TEST_DIRECTORY, 'G.json')) == 'formula'
+    assert json_cnf.json_kind(os.path.join(TEST_DIRECTORY, 'A_Sat.json')) == 'scheduling'
+
+def test_read_json_cnf_odd_names(tmp_path):
+    formula = [[["a]", True], ["b\"[", False], ["\u00e9", True]], [], [["c", True], ["a]", False]]]
+    path = tmp_path / 'odd.json'
+    path.write_text(json.dumps(formula, indent=3))
+    cnf = json_cnf.read_json_cnf(str(path))
+    assert list(cnf.clauses()) == [[("a]", True), ('b"[', False), ("\u00e9", True)], [],
+                                   [("c", True), ("a]", False)]]
+    path.write_text(" [ ]\n")
+    assert len(json_cnf.read_json_cnf(str(path))) == 0
+    path.write_text("")
+    assert json_cnf.json_kind(str(path)) is None
+
+def test_read_json_cnf_malformed(tmp_path):
+    path = tmp_path / 'bad.json'
+    for text in ('', '[[["a", true]], [["a", 1]]]', '[[["a", true]] [["b", true]]]',
+                 '[[["a", true]],]', '[[["a", true],]]', '[[["a", true]], [["b", fals',
+                 '[[["a", true]]] []', '{"a": true}', '[[["x[]", true]]'):
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            json_cnf.read_json_cnf(str(path))
+    # brackets inside names are no clauses
+    path.write_text('[[["x[]", true]]]')
+    assert list(json_cnf.read_json_cnf(str(path)).clauses()) == [[("x[]", True)]]
+    with pytest.raises(ValueError):
+        json_cnf.read_json_cnf(os.path.join(TEST_DIRECTORY, 'A_Sat.json'))
+
+def test_wrapper_lazy_data(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import wrapper
+    assert set(wrapper.cases) == {'A_Sat', 'B_Sat', 'C_Unsat', 'D_Sat', 'E_Unsat'}
+    wrapper.loaded.clear()
+    data = wrapper.load_data({})
+    assert set(data) == set(wrapper.cases)
+    assert data['B_Sat'] == list(_open_scheduling_case('B_Sat'))
+    # nothing is parsed again, even after a reload
+    importlib.reload(wrapper)
+    assert wrapper.load_data({})['B_Sat'] is data['B_Sat']
+
+def test_wrapper_results_follow_lab(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import wrapper
+    monkeypatch.setattr(wrapper, 'results_root', str(tmp_path))
+    monkeypatch.setattr(wrapper, 'results', None)
+    students, sessions = _open_scheduling_case('B_Sat')
+    _check_schedule(students, sessions, wrapper.ui_assign([students, sessions]))
+    results = wrapper.results
+    assert results.directory == str(tmp_path / wrapper.lab_digest)
+    importlib.reload(wrapper)
+    assert wrapper.results_root == str(tmp_path) and wrapper.results is results
+    wrapper.ui_assign([students, sessions])
+    assert wrapper.results is results and results.hits == 1
+    # results of another version of lab are dropped, in memory and on disk
+    stale = str(tmp_path / 'stale')
+    wrapper.results = lab.ResultCache(directory=stale)
+    wrapper.ui_assign([students, sessions])
+    assert wrapper.results is not results and wrapper.results.directory == results.directory
+    assert os.listdir(str(tmp_path)) == [wrapper.lab_digest]
+
+def test_reload_modules_lazily(tmp_path, monkeypatch):
+    source = tmp_path / 'rpc_example.py'
+    source.write_text("loads = globals().get('loads', 0) + 1\n"
+                      "def answer(d):\n    return 1\n"
+                      "def _hidden(d):\n    return 0\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(RPCServerHandler, 'modules', [])
+    monkeypatch.setattr(RPCServerHandler, 'mtimes', {})
+    RPCServerHandler.register_module('rpc_example')
+    import rpc_example
+    assert RPCServerHandler.find_function('answer')({}) == 1
+    assert RPCServerHandler.find_function('_hidden') is None
+    assert RPCServerHandler.find_function('loads') is None
+    RPCServerHandler.reload_modules()
+    assert rpc_example.loads == 1
+    source.write_text("loads = globals().get('loads', 0) + 1\n"
+                      "def answer(d):\n    return 2\n")
+    mtime = os.stat(str(source)).st_mtime_ns + 10**9
+    os.utime(str(source), ns=(mtime, mtime))
+    RPCServerHandler.reload_modules()
+    RPCServerHandler.reload_modules()
+    assert rpc_example.loads == 2
+    assert RPCServerHandler.find_function('answer')({}) == 2
+
+
+## TESTS FOR BRANCHING HEURISTICS
+
+def test_heuristics_big():
+    for mode in ('trail', 'cdcl'):
+        for heuristic in lab.HEURISTICS:
+            for phase_saving in (False, True):
+                options = {'mode': mode, 'heuristic': heuristic, 'phase_saving': phase_saving,
+                           'fast_paths': False}
+                _test_from_file('F', _satisfiable, **options)
+                _test_from_file('C', _satisfiable, **options)
+                _test_from_file('E', _unsatisfiable, **options)
+
+def test_vsids_heap_order():
+    vsids = lab.VSIDS(lab.CNF.from_formula([[(v, True) for v in 'abcd']]))
+    for var in (2, 2, 3, 2, 0):
+        vsids.bump(var)
+        vsids.decay()
+    vals = bytearray([lab.UNSET]) * 8
+    picked = []
+    while True:
+        lit = vsids.pick(vals)
+        if lit is None:
+            break
+        picked.append(lit >> 1)
+        vals[lit] = lab.TRUE
+        vals[lit ^ 1] = lab.FALSE
+    # 2 was bumped three times, 0 was bumped last, 1 was never bumped
+    assert picked == [2, 0, 3, 1]
+
+
 # These three tests use your satisfying_assignment code to solve sudoku
 # puzzles (formulated as Boolean formulas).
 #
@@ -208,18 +1153,24 @@ def _open_scheduling_case(casename):
                  for p in v[0].items()}, v[1])
 
 
-def _scheduling_satisfiable(casename=None, students=None, sessions=None):
+def _scheduling_satisfiable(casename=None, students=None, sessions=None, auxiliary=False, **kwargs):
     if casename is not None:
         students, sessions = _open_scheduling_case(casename)
     formula = lab.boolify_scheduling_problem(copy.deepcopy(students),
-                                                  copy.deepcopy(sessions))
+                                                  copy.deepcopy(sessions), **kwargs)
     sched = lab.satisfying_assignment(formula)
+    _check_schedule(students, sessions, sched, auxiliary)
+
+
+def _check_schedule(students, sessions, sched, auxiliary=False):
     assert sched is not None
+    sessions = dict(sessions)
 
     unplaced_students = set(students)
 
     for var, val in sched.items():
-        if val:
+        # auxiliary variables are only allowed when the test expects them
+        if val and not (auxiliary and lab.is_auxiliary(var)):
             student, session = var.split('_')
 
             assert student in unplaced_students, "Students should be assigned at most one session."
@@ -236,11 +1187,11 @@ def _scheduling_satisfiable(casename=None, students=None, sessions=None):
     assert not unplaced_students, "Some students were not placed into a section!"
 
 
-def _scheduling_unsatisfiable(casename):
+def _scheduling_unsatisfiable(casename, **kwargs):
     students, sessions = _open_scheduling_case(casename)
     sched = lab.satisfying_assignment(
         lab.boolify_scheduling_problem(copy.deepcopy(students),
-                                            copy.deepcopy(sessions)))
+                                            copy.deepcopy(sessions), **kwargs))
     assert sched is None
 
 def test_scheduling_small():
@@ -269,6 +1220,127 @@ def test_scheduling_D():
 def test_scheduling_E():
     _scheduling_unsatisfiable('E_Unsat')
 
+def test_at_most_sequential():
+    import itertools
+    for n in range(1, 6):
+        for k in range(n+1):
+            variables = ['x%s' % i for i in range(n)]
+            rule = list(lab.at_most_sequential(variables, k, 'room'))
+            for values in itertools.product((False, True), repeat=n):
+                fixed = [[(var, val)] for var, val in zip(variables, values)]
+                sat = lab.satisfying_assignment(rule + fixed) is not None
+                assert sat == (sum(values) <= k)
+
+def test_scheduling_sequential_encoding():
+    for casename in ('A_Sat', 'B_Sat', 'D_Sat'):
+        _scheduling_satisfiable(casename, auxiliary=True, capacity_encoding='sequential')
+    for casename in ('C_Unsat', 'E_Unsat'):
+        _scheduling_unsatisfiable(casename, capacity_encoding='sequential')
+
+def test_at_most_one_encodings():
+    import itertools
+    for encoding, at_most_one in lab.AT_MOST_ONE_ENCODINGS.items():
+        for n in (1, 2, 5, 7, 10):
+            variables = ['x%s' % i for i in range(n)]
+            rule = list(at_most_one(variables, 'student'))
+            for values in itertools.product((False, True), repeat=n):
+                fixed = [[(var, val)] for var, val in zip(variables, values)]
+                sat = lab.satisfying_assignment(rule + fixed) is not None
+                assert sat == (sum(values) <= 1), encoding
+
+def test_scheduling_one_room_encodings():
+    for encoding in lab.AT_MOST_ONE_ENCODINGS:
+        for only_listed in (False, True):
+            options = {'one_room_encoding': encoding, 'only_listed': only_listed}
+            for casename in ('A_Sat', 'B_Sat', 'D_Sat'):
+                _scheduling_satisfiable(casename, auxiliary=True, **options)
+            for casename in ('C_Unsat', 'E_Unsat'):
+                _scheduling_unsatisfiable(casename, **options)
+
+def test_scheduling_many_rooms():
+    students = {"student%s" % i: ["session%s" % (i % 40), "session%s" % ((i+1) % 40)]
+                for i in range(200)}
+    sessions = {"session%s" % i: 5 for i in range(40)}
+    # pairwise would need 200 * C(40, 2) = 156000 clauses for the second rule alone
+    formula = lab.boolify_scheduling_problem(students, sessions, only_listed=True)
+    assert len(formula) < 20000
+    _scheduling_satisfiable(None, students, sessions, auxiliary=True, only_listed=True)
+
+def test_scheduling_matching():
+    for casename in ('A_Sat', 'B_Sat', 'D_Sat'):
+        students, sessions = _open_scheduling_case(casename)
+        _check_schedule(students, sessions, lab.solve_scheduling_problem(students, sessions))
+    for casename in ('C_Unsat', 'E_Unsat'):
+        students, sessions = _open_scheduling_case(casename)
+        assert lab.solve_scheduling_problem(students, sessions) is None
+
+def test_scheduling_matching_random():
+    import random
+    rng = random.Random(6009)
+    for _ in range(200):
+        sessions = {"session%s" % i: rng.randint(0, 3) for i in range(rng.randint(1, 5))}
+        students = {"student%s" % i: rng.sample(sorted(sessions), rng.randint(1, len(sessions)))
+                    for i in range(rng.randint(1, 8))}
+        sched = lab.solve_scheduling_problem(students, sessions)
+        expected = lab.satisfying_assignment(lab.boolify_scheduling_problem(students, sessions))
+        assert (sched is None) == (expected is None)
+        if sched is not None:
+            _check_schedule(students, sessions, sched)
+
+def test_scheduling_matching_long_chain():
+    # the last student only fits if every other one moves over a room, a
+    # chain of moves longer than Python's default recursion limit
+    n = 1500
+    students = {"student%s" % i: ["session%s" % i, "session%s" % (i + 1)] for i in range(n)}
+    students["last"] = ["session0"]
+    sessions = {"session%s" % i: 1 for i in range(n + 1)}
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)
+    try:
+        sched = lab.schedule_by_matching(students, sessions)
+        assert sched["last_session0"] and sched["student%s_session%s" % (n - 1, n)]
+        del sessions["session%s" % n]
+        assert lab.schedule_by_matching(students, sessions) is None
+    finally:
+        sys.setrecursionlimit(limit)
+
+def test_scheduling_extra_clauses():
+    students, sessions = _open_scheduling_case('B_Sat')
+    sched = lab.solve_scheduling_problem(students, sessions)
+    # keep the first student away from the session matching gave them
+    moved = [var for var, val in sched.items() if val][0]
+    sched = lab.solve_scheduling_problem(students, sessions, [[(moved, False)]])
+    _check_schedule(students, sessions, sched)
+    assert sched[moved] is False
+
+def test_scheduling_large_room():
+    # C(60, 11) naive clauses would never fit in memory
+    students = {"student%s" % i: ["session0", "session1"] for i in range(60)}
+    sessions = {"session0": 10, "session1": 50}
+    formula = lab.boolify_scheduling_problem(students, sessions)
+    assert len(formula) < 10000
+    _scheduling_satisfiable(None, students, sessions, auxiliary=True)
+
+def test_scheduling_clauses_stream():
+    import tracemalloc
+    students, sessions = bench.random_scheduling(40, 0)
+    formula = lab.boolify_scheduling_problem(students, sessions)
+    clauses = lab.scheduling_clauses(students, sessions)
+    assert iter(clauses) is clauses
+    assert list(clauses) == formula
+    # straight into the solver, without the list of clauses
+    peaks = []
+    for make in (lambda: lab.boolify_scheduling_problem(students, sessions),
+                 lambda: lab.scheduling_clauses(students, sessions)):
+        tracemalloc.start()
+        cnf = lab.CNF.from_formula(make())
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert list(cnf.clauses()) == list(lab.CNF.from_formula(formula).clauses())
+    assert peaks[1] * 2 < peaks[0]
+    sched = lab.Solver(lab.scheduling_clauses(students, sessions)).solve()
+    _check_schedule(students, sessions, sched, auxiliary=True)
+
 
 if __name__ == '__main__':
     import os
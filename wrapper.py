@@ -1,6 +1,8 @@
 import os
 import importlib, importlib.util
 import json
+import hashlib
+import shutil
 
 try:
     import lab
@@ -8,23 +10,68 @@ try:
 except ImportError:
     import solution
     lab = solution
+import json_cnf
 
-data = {}
-for i in os.listdir('test_inputs'):
-    if not i.endswith('.json'):
-        continue
+# scheduling cases of test_inputs, told apart from the formulas by their
+# first bytes, so that nothing else is ever parsed; they're only loaded
+# when the UI first asks for them
+cases = {}
+for i in sorted(os.listdir('test_inputs')):
+    if i.endswith('.json') and json_cnf.json_kind('./test_inputs/' + i) == 'scheduling':
+        cases[i.rsplit('.', 1)[0]] = './test_inputs/' + i
 
-    x = i.rsplit('.', 1)[0]
-    
-    with open('./test_inputs/%s.json' % x, 'r') as f:
-        js = json.load(f)
-        if type(js[0]) == dict:
-            # Only add the test cases formatted as scheduling problems.
-            data[x] = js
+# (modification time, contents) of the cases loaded so far, by path, kept
+# across reloads of this module
+try:
+    loaded
+except NameError:
+    loaded = {}
 
 def load_data(d):
+    data = {}
+    for x, path in cases.items():
+        mtime = os.stat(path).st_mtime_ns
+        if path not in loaded or loaded[path][0] != mtime:
+            with open(path, 'r') as f:
+                loaded[path] = (mtime, json.load(f))
+        data[x] = loaded[path][1]
     return data
 
+# schedules the UI asked for before; kept across reloads of this module (in
+# memory) and restarts of the server (on disk), but only for as long as the
+# source of lab stays the same, so that a fix to lab shows up after /restart.
+# Nothing is written until the UI asks for a schedule.
+def _lab_digest():
+    with open(lab.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+lab_digest = _lab_digest()
+try:
+    results_root
+except NameError:
+    results_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'results')
+try:
+    results
+except NameError:
+    results = None
+
+def _result_cache():
+    global results
+    directory = os.path.join(results_root, lab_digest)
+    if results is None or results.directory != directory:
+        # the results of any other version of lab are no use anymore
+        if os.path.isdir(results_root):
+            for name in os.listdir(results_root):
+                path = os.path.join(results_root, name)
+                if path == directory:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        results = lab.ResultCache(directory=directory)
+    return results
+
 import traceback
 def ui_assign(case):
     def trim(val, lim=400):
@@ -32,12 +79,10 @@ def ui_assign(case):
         return val_str if len(val_str)<lim else val_str[0:lim]+' ...'
 
     try:
-        sat = lab.boolify_scheduling_problem({
+        assign = lab.solve_scheduling_problem({
                 k: set(v) for k, v in case[0].items()
-        }, case[1])
-        print("lab.boolify_scheduling_problem returned: " + trim(sat), flush=True)
-        assign = lab.satisfying_assignment(sat)
-        print("lab.satisfying_assignment returned: " + trim(assign), flush=True)
+        }, case[1], cache=_result_cache())
+        print("lab.solve_scheduling_problem returned: " + trim(assign), flush=True)
         return assign
     except:
         print(traceback.format_exc(), flush=True)